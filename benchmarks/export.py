@@ -0,0 +1,159 @@
+"""Measure GET /items/export throughput and peak memory.
+
+Seeds a throwaway SQLite database (or uses ``--database-url``) with
+``--rows`` items in a separate process, then streams the export through the
+ASGI app in-process. The response body is counted and discarded rather than
+buffered, so peak RSS reflects the server side of the stream.
+
+Usage:
+    python -m benchmarks.export --rows 1000000 --format ndjson
+    python -m benchmarks.export --rows 1000000 --format csv --gzip
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+SEED_CHUNK = 10_000
+
+
+def _max_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def seed(rows: int):
+    from sqlalchemy import insert
+
+    from database import SessionLocal, init_db
+    from models import Category, Item as DBItem, User as DBUser
+
+    init_db()
+    with SessionLocal() as db:
+        # The export authenticates as this user.
+        db.add(DBUser(username="bench", hashed_password="-", disabled=False))
+        for start in range(0, rows, SEED_CHUNK):
+            db.execute(
+                insert(DBItem),
+                [
+                    {
+                        "name": f"tool {i}",
+                        "description": f"benchmark item number {i}",
+                        "price": float(i % 500),
+                        "category": Category.TOOLS,
+                    }
+                    for i in range(start, min(start + SEED_CHUNK, rows))
+                ],
+            )
+            db.commit()
+
+
+async def _stream(app, path: str, headers: dict) -> tuple[int, int]:
+    status = 0
+    received = 0
+    done = asyncio.Event()
+
+    async def receive():
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status, received
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            received += len(message.get("body", b""))
+            if not message.get("more_body"):
+                done.set()
+
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+        "client": ("127.0.0.1", 0),
+        "server": ("bench", 80),
+    }
+    await app(scope, receive, send)
+    return status, received
+
+
+def run_export(args):
+    import logging
+
+    from main import app
+    from services.auth_service import create_access_token
+
+    logging.disable(logging.CRITICAL)
+    rss_before = _max_rss_mb()
+    headers = {
+        "Authorization": f"Bearer {create_access_token({'sub': 'bench'})}",
+        "Accept-Encoding": "gzip" if args.gzip else "identity",
+    }
+    start = time.perf_counter()
+    status, received = asyncio.run(
+        _stream(app, f"/items/export?format={args.format}", headers)
+    )
+    elapsed = time.perf_counter() - start
+    if status != 200:
+        raise SystemExit(f"export failed with HTTP {status}")
+    print(
+        json.dumps(
+            {
+                "rows": args.rows,
+                "format": args.format,
+                "gzip": args.gzip,
+                "seconds": round(elapsed, 2),
+                "rows_per_sec": round(args.rows / elapsed),
+                "bytes": received,
+                "rss_before_mb": round(rss_before, 1),
+                "peak_rss_mb": round(_max_rss_mb(), 1),
+            }
+        )
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    parser.add_argument("--gzip", action="store_true")
+    parser.add_argument("--database-url")
+    parser.add_argument("--step", choices=["seed", "export"], help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.step == "seed":
+        return seed(args.rows)
+    if args.step == "export":
+        return run_export(args)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env.setdefault("ENVIRONMENT", "benchmark")
+        env.setdefault("SECRET_KEY", "benchmark-secret")
+        env["DATABASE_URL"] = args.database_url or f"sqlite:///{tmp}/export.db"
+        command = [sys.executable, "-m", "benchmarks.export", f"--rows={args.rows}"]
+        subprocess.run(command + ["--step=seed"], env=env, check=True)
+        subprocess.run(
+            command
+            + ["--step=export", f"--format={args.format}"]
+            + (["--gzip"] if args.gzip else []),
+            env=env,
+            check=True,
+        )
+
+
+if __name__ == "__main__":
+    main()
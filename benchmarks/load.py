@@ -0,0 +1,361 @@
+"""Mixed-workload load test of the API, with JSON baselines.
+
+Seeds a throwaway SQLite database (or ``--database-url``, e.g. a disposable
+Postgres) with users and items in a separate process, then runs each
+scenario for ``--duration`` seconds with ``--concurrency`` simulated users.
+Requests go through the ASGI app in-process by default, or over HTTP to
+``python server.py`` (one uvicorn worker unless ``WEB_CONCURRENCY`` says
+otherwise) with ``--server``.
+
+Scenarios:
+    login_storm   POST /auth/token for random seeded users (bcrypt-bound)
+    hot_reads     GET /items/items/{id}, 90% of them on 10 hot items
+    write_burst   POST /items/ and PUT /items/update/{id}
+    crud          authenticated create, read, list, update and delete mix
+
+Each scenario reports requests/sec, p50/p95/p99 latency and errors, in
+total and per operation. Users draw from a seeded RNG, so two runs send
+the same request sequence per user. ``--save`` writes the report as a
+baseline; ``--compare`` checks it against one and exits with status 1 if
+throughput dropped or p95 rose by more than ``--tolerance``.
+
+Usage:
+    python -m benchmarks.load --duration 20 --save baseline.json
+    python -m benchmarks.load --scenario hot_reads crud --compare baseline.json
+    python -m benchmarks.load --server --concurrency 64
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+SEED_USERS = 50
+SEED_ITEMS = 2000
+HOT_KEYS = 10
+PASSWORD = "benchmark-password"
+
+
+def seed():
+    from sqlalchemy import insert
+
+    from database import SessionLocal, init_db
+    from models import Category, Item as DBItem, User as DBUser
+    from services.auth_service import get_password_hash
+
+    init_db()
+    # One bcrypt hash serves every user; logins still verify at full cost.
+    hashed_password = get_password_hash(PASSWORD)
+    with SessionLocal() as db:
+        db.execute(
+            insert(DBUser),
+            [
+                {
+                    "username": f"bench{i}",
+                    "email": f"bench{i}@example.com",
+                    "hashed_password": hashed_password,
+                    "disabled": False,
+                }
+                for i in range(SEED_USERS)
+            ],
+        )
+        db.execute(
+            insert(DBItem),
+            [
+                {
+                    "name": f"tool {i}",
+                    "description": f"benchmark item number {i}",
+                    "price": float(i % 500),
+                    "category": Category.TOOLS,
+                }
+                for i in range(SEED_ITEMS)
+            ],
+        )
+        db.commit()
+
+
+# Operations take (client, rng, owned item ids) and return the response.
+
+
+async def login(client, rng, owned):
+    return await client.post(
+        "/auth/token",
+        data={"username": f"bench{rng.randrange(SEED_USERS)}", "password": PASSWORD},
+    )
+
+
+def _item_id(rng) -> int:
+    if rng.random() < 0.9:
+        return rng.randint(1, HOT_KEYS)
+    return rng.randint(1, SEED_ITEMS)
+
+
+async def read_item(client, rng, owned):
+    return await client.get(f"/items/items/{_item_id(rng)}")
+
+
+async def list_items(client, rng, owned):
+    low = rng.randrange(0, 450)
+    return await client.get(
+        "/items/", params={"limit": 20, "min_price": low, "max_price": low + 50}
+    )
+
+
+async def create_item(client, rng, owned):
+    response = await client.post(
+        "/items/",
+        json={
+            "name": f"load tool {rng.random():.6f}",
+            "description": "created by benchmarks.load",
+            "price": round(rng.uniform(1, 100), 2),
+            "category": "tools",
+        },
+    )
+    if response.status_code == 200:
+        owned.append(response.json()["added"]["id"])
+    return response
+
+
+async def update_item(client, rng, owned):
+    # Own items first, so concurrent users rarely write the same row.
+    item_id = rng.choice(owned) if owned else _item_id(rng)
+    return await client.put(
+        f"/items/update/{item_id}", json={"price": round(rng.uniform(1, 100), 2)}
+    )
+
+
+async def delete_item(client, rng, owned):
+    if not owned:
+        return await create_item(client, rng, owned)
+    return await client.delete(f"/items/delete/{owned.pop()}")
+
+
+SCENARIOS = {
+    "login_storm": [(1, login)],
+    "hot_reads": [(1, read_item)],
+    "write_burst": [(3, create_item), (1, update_item)],
+    "crud": [
+        (4, read_item),
+        (2, list_items),
+        (2, create_item),
+        (1, update_item),
+        (1, delete_item),
+    ],
+}
+
+
+def _percentiles(latencies: list[float]) -> dict:
+    if len(latencies) < 2:
+        latencies = latencies * 2 or [0.0, 0.0]
+    cuts = statistics.quantiles(latencies, n=100)
+    return {
+        "p50_ms": round(cuts[49] * 1000, 2),
+        "p95_ms": round(cuts[94] * 1000, 2),
+        "p99_ms": round(cuts[98] * 1000, 2),
+    }
+
+
+def summarize(samples: list[tuple[str, float, int]], elapsed: float) -> dict:
+    """Totals and per-operation figures from (operation, seconds, status)."""
+    by_operation = defaultdict(list)
+    for sample in samples:
+        by_operation[sample[0]].append(sample)
+
+    def figures(group):
+        ok = [seconds for _, seconds, status in group if status < 400]
+        statuses = defaultdict(int)
+        for _, _, status in group:
+            if status >= 400:
+                statuses[str(status)] += 1
+        return {
+            "requests": len(group),
+            "requests_per_sec": round(len(group) / elapsed, 1),
+            **_percentiles(ok),
+            "errors": sum(statuses.values()),
+            "error_statuses": dict(statuses),
+        }
+
+    return {
+        **figures(samples),
+        "operations": {name: figures(group) for name, group in by_operation.items()},
+    }
+
+
+async def run_scenario(client, name: str, args) -> dict:
+    operations = SCENARIOS[name]
+    weights = [weight for weight, _ in operations]
+    samples: list[tuple[str, float, int]] = []
+
+    async def user(index: int, until: float, record: bool):
+        rng = random.Random(f"{args.seed}:{name}:{index}")
+        owned: list[int] = []
+        while time.perf_counter() < until:
+            operation = rng.choices(operations, weights)[0][1]
+            start = time.perf_counter()
+            try:
+                status = (await operation(client, rng, owned)).status_code
+            except Exception:
+                status = 599
+            if record:
+                samples.append(
+                    (operation.__name__, time.perf_counter() - start, status)
+                )
+
+    for record, seconds in ((False, args.warmup), (True, args.duration)):
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(user(index, start + seconds, record) for index in range(args.concurrency))
+        )
+    return summarize(samples, time.perf_counter() - start)
+
+
+async def run_all(args, url=None) -> dict:
+    import httpx
+
+    from services.auth_service import create_access_token
+
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'bench0'})}"}
+    limits = httpx.Limits(max_connections=args.concurrency)
+    if url:
+        client = httpx.AsyncClient(
+            base_url=url, headers=headers, limits=limits, timeout=60.0
+        )
+        async with client:
+            return {
+                name: await run_scenario(client, name, args) for name in args.scenario
+            }
+
+    from main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench", headers=headers
+        ) as client:
+            return {
+                name: await run_scenario(client, name, args) for name in args.scenario
+            }
+
+
+def run_server(args, env: dict) -> dict:
+    from benchmarks.scaling import _free_port, _wait_ready
+
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "server.py"],
+        env={**env, "WEB_BIND": f"127.0.0.1:{port}"},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        url = f"http://127.0.0.1:{port}"
+        _wait_ready(url)
+        return asyncio.run(run_all(args, url))
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+
+
+def compare(baseline: dict, report: dict, tolerance: float) -> list[str]:
+    """Regressions of ``report`` against ``baseline``, as readable lines."""
+    regressions = []
+    for name, current in report["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if before is None:
+            continue
+        if current["requests_per_sec"] < before["requests_per_sec"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: {current['requests_per_sec']} req/s, "
+                f"baseline {before['requests_per_sec']}"
+            )
+        if current["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p95 {current['p95_ms']}ms, baseline {before['p95_ms']}ms"
+            )
+        if current["errors"] > before["errors"]:
+            regressions.append(
+                f"{name}: {current['errors']} errors, baseline {before['errors']}"
+            )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--scenario", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS)
+    )
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--warmup", type=float, default=2.0, help="seconds")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--server", action="store_true", help="go through uvicorn")
+    parser.add_argument("--database-url")
+    parser.add_argument("--save", metavar="PATH", help="write the report here")
+    parser.add_argument("--compare", metavar="PATH", help="baseline to check")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    parser.add_argument("--step", choices=["seed"], help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.step == "seed":
+        return seed()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env.setdefault("ENVIRONMENT", "benchmark")
+        env.setdefault("SECRET_KEY", "benchmark-secret")
+        env["DATABASE_URL"] = args.database_url or f"sqlite:///{tmp}/load.db"
+        # Keep the log pipeline out of the measurement.
+        env["LOG_SUCCESS_SAMPLE_RATE"] = "0"
+        env["LOG_FILE"] = f"{tmp}/logs/app.log"
+        # login_storm measures the bcrypt path, not the login throttle; set
+        # these to measure the throttle instead.
+        env.setdefault("LOGIN_IP_BURST", "0")
+        env.setdefault("LOGIN_USER_BURST", "0")
+        subprocess.run(
+            [sys.executable, "-m", "benchmarks.load", "--step=seed"],
+            env=env,
+            check=True,
+        )
+        os.environ.update(env)
+        if args.server:
+            scenarios = run_server(args, env)
+        else:
+            scenarios = asyncio.run(run_all(args))
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "database": env["DATABASE_URL"].split(":", 1)[0],
+            "database_async": env.get("DATABASE_ASYNC", "false"),
+            "transport": "uvicorn" if args.server else "asgi",
+            "duration": args.duration,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+        },
+        "scenarios": scenarios,
+    }
+    print(json.dumps(report, indent=2))
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), report, args.tolerance)
+        for line in regressions:
+            print(f"regression: {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
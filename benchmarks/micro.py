@@ -0,0 +1,196 @@
+"""Microbenchmarks of the service, schema, token and hashing layers.
+
+Each case is timed in isolation with ``timeit``: the per-call time is the
+best of ``--repeat`` runs, each sized to take about 0.2s. The layers:
+
+    services  sync item_service calls on an in-memory SQLite database
+    schemas   Item/ItemUpdate validation and JSON serialization
+    tokens    create_access_token and the jwt.decode done by get_current_user
+    hashing   verify_password at the configured bcrypt cost
+
+Prints one JSON report; ``--history`` also appends it as a line to a JSON
+Lines file (with the git revision and a timestamp), so a regression can be
+traced to a layer and a commit by diffing entries.
+
+Usage:
+    python -m benchmarks.micro
+    python -m benchmarks.micro --layer schemas tokens --history bench-history.jsonl
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import timeit
+from datetime import datetime, timezone
+
+os.environ.setdefault("ENVIRONMENT", "benchmark")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+
+SEED_ITEMS = 1000
+
+ITEM_PAYLOAD = {
+    "name": "Cordless drill",
+    "description": "18V cordless drill with two batteries and a charger",
+    "price": 12.5,
+    "category": "tools",
+}
+
+
+def service_cases() -> dict:
+    from sqlalchemy import create_engine, insert
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+
+    from models import Base, Category, Item as DBItem
+    from schemas.item import Item, ItemUpdate
+    from services import item_service
+
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    db.execute(
+        insert(DBItem),
+        [
+            {
+                "name": f"tool {i}",
+                "description": f"benchmark item number {i}",
+                "price": float(i % 500),
+                "category": Category.TOOLS,
+            }
+            for i in range(SEED_ITEMS)
+        ],
+    )
+    db.commit()
+    new_item = Item(**ITEM_PAYLOAD)
+    change = ItemUpdate(price=15.0)
+
+    def get_uncached():
+        item_service.item_reads.invalidate(7)
+        item_service.get_item_by_id_service(db, 7)
+
+    return {
+        "get_item_by_id (cached)": lambda: item_service.get_item_by_id_service(db, 7),
+        "get_item_by_id (uncached)": get_uncached,
+        "list_items (20)": lambda: item_service.list_items_service(db, 100, 20),
+        "list_items (20, price filter)": lambda: item_service.list_items_service(
+            db, None, 20, min_price=100, max_price=150
+        ),
+        "add_item": lambda: item_service.add_item_service(db, new_item),
+        "update_item": lambda: item_service.update_item_service(db, 11, change),
+    }
+
+
+def schema_cases() -> dict:
+    from schemas.item import Item, ItemRead, ItemUpdate
+
+    item = Item(**ITEM_PAYLOAD)
+    read = ItemRead(**ITEM_PAYLOAD, id=1, version=3)
+    update_json = json.dumps({"price": 15.0, "name": "Drill"})
+    return {
+        "Item.model_validate": lambda: Item.model_validate(ITEM_PAYLOAD),
+        "Item.model_validate_json": lambda: Item.model_validate_json(
+            json.dumps(ITEM_PAYLOAD)
+        ),
+        "ItemUpdate.model_validate_json": lambda: ItemUpdate.model_validate_json(
+            update_json
+        ),
+        "Item.model_dump": item.model_dump,
+        "ItemRead.model_dump_json": read.model_dump_json,
+    }
+
+
+def token_cases() -> dict:
+    from jose import jwt
+
+    from dependencies.auth import ALGORITHM, SECRET_KEY
+    from services.auth_service import create_access_token
+
+    token = create_access_token({"sub": "bench"})
+    return {
+        "create_access_token": lambda: create_access_token({"sub": "bench"}),
+        "jwt.decode": lambda: jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]),
+    }
+
+
+def hashing_cases() -> dict:
+    from services.auth_service import get_password_hash, verify_password
+
+    hashed = get_password_hash("benchmark-password")
+    return {
+        "verify_password": lambda: verify_password("benchmark-password", hashed),
+    }
+
+
+LAYERS = {
+    "services": service_cases,
+    "schemas": schema_cases,
+    "tokens": token_cases,
+    "hashing": hashing_cases,
+}
+
+
+def measure(fn, repeat: int) -> dict:
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    per_call = [total / number for total in timer.repeat(repeat=repeat, number=number)]
+    return {
+        "us_per_call": round(min(per_call) * 1e6, 3),
+        "median_us": round(statistics.median(per_call) * 1e6, 3),
+        "calls_per_sec": round(1 / min(per_call)),
+        "number": number,
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--layer", nargs="+", choices=list(LAYERS), default=list(LAYERS)
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--history", metavar="PATH", help="append the report here")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.CRITICAL)
+    results = {}
+    for layer in args.layer:
+        results[layer] = {
+            name: measure(fn, args.repeat) for name, fn in LAYERS[layer]().items()
+        }
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "results": results,
+    }
+    print(json.dumps(report, indent=2))
+    if args.history:
+        with open(args.history, "a") as f:
+            f.write(json.dumps(report) + "\n")
+
+
+if __name__ == "__main__":
+    main()
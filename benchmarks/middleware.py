@@ -0,0 +1,154 @@
+"""Request middleware overhead: BaseHTTPMiddleware vs pure ASGI.
+
+Builds two otherwise identical apps with a trivial JSON route and a
+streaming route. "base_http" wraps them in the ``@app.middleware("http")``
+request logger main.py used to register; "asgi" uses
+``utils.middleware.RequestContextMiddleware``. Requests are driven straight
+through the ASGI interface with ``--concurrency`` in flight, so the numbers
+are middleware plus framework cost with no network or database involved.
+
+Usage:
+    python -m benchmarks.middleware --requests 20000 --concurrency 32
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import time
+
+os.environ.setdefault("ENVIRONMENT", "benchmark")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+
+from fastapi import FastAPI, Request  # noqa: E402
+from fastapi.responses import StreamingResponse  # noqa: E402
+
+from utils.logging import log_request  # noqa: E402
+from utils.middleware import RequestContextMiddleware  # noqa: E402
+from utils.routes import route_template  # noqa: E402
+
+STREAM_CHUNKS = 16
+
+
+def _routes(app: FastAPI) -> FastAPI:
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            for _ in range(STREAM_CHUNKS):
+                yield b"x" * 1024
+
+        return StreamingResponse(chunks(), media_type="application/octet-stream")
+
+    return app
+
+
+def base_http_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.middleware("http")
+    async def log_requests(request: Request, call_next):
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            log_request(
+                request.method,
+                route_template(request.scope) or request.url.path,
+                status,
+                (time.perf_counter() - start) * 1000,
+            )
+
+    return _routes(app)
+
+
+def asgi_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(RequestContextMiddleware)
+    return _routes(app)
+
+
+async def _request(app, path: str) -> float:
+    done = asyncio.Event()
+
+    async def receive():
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body" and not message.get("more_body"):
+            done.set()
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 0),
+        "server": ("bench", 80),
+        "app": app,
+    }
+    start = time.perf_counter()
+    await app(scope, receive, send)
+    return time.perf_counter() - start
+
+
+async def _run(app, path: str, requests: int, concurrency: int) -> dict:
+    latencies: list[float] = []
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            latencies.append(await _request(app, path))
+
+    # Warm up routing and dependency caches before timing.
+    for _ in range(100):
+        await _request(app, path)
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    cuts = statistics.quantiles(latencies, n=100)
+    return {
+        "requests_per_sec": round(len(latencies) / elapsed),
+        "p50_ms": round(cuts[49] * 1000, 3),
+        "p99_ms": round(cuts[98] * 1000, 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args(argv)
+
+    # Measure the middleware, not the log handlers.
+    logging.disable(logging.CRITICAL)
+    results = {}
+    for name, factory in (("base_http", base_http_app), ("asgi", asgi_app)):
+        app = factory()
+        for path in ("/ping", "/stream"):
+            results[f"{name} {path}"] = asyncio.run(
+                _run(app, path, args.requests, args.concurrency)
+            )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""Throughput of server.py as the worker count grows.
+
+Seeds a throwaway SQLite database (or uses ``--database-url``), then for
+each worker count starts ``python server.py`` with ``WEB_CONCURRENCY`` set,
+drives ``GET /items/items/{id}`` from ``--clients`` load-generator
+processes for ``--duration`` seconds and stops the server with SIGTERM.
+Reports requests/sec, p50/p99 latency and scaling efficiency against one
+worker (1.0 is perfectly linear).
+
+The load generators share the machine with the server; for a clean curve
+give them their own cores (e.g. ``taskset``) or run with worker counts
+below half the CPUs.
+
+Usage:
+    python -m benchmarks.scaling --workers 1 2 4 --duration 15
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SEED_ROWS = 1000
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(url: str, timeout: float = 60.0):
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{url}/docs", timeout=1.0).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit(f"server at {url} did not start within {timeout}s")
+
+
+async def _drive(url: str, token: str, concurrency: int, duration: float):
+    import httpx
+
+    latencies: list[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def user(client: httpx.AsyncClient, offset: int):
+        nonlocal errors
+        item_id = offset
+        while time.perf_counter() < deadline:
+            item_id = item_id % SEED_ROWS + 1
+            start = time.perf_counter()
+            response = await client.get(f"/items/items/{item_id}")
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(
+        base_url=url, headers={"Authorization": f"Bearer {token}"}, limits=limits
+    ) as client:
+        await asyncio.gather(*(user(client, i * 37) for i in range(concurrency)))
+    return latencies, errors
+
+
+def _client(args):
+    return asyncio.run(_drive(*args))
+
+
+def run_load(url: str, token: str, clients: int, concurrency: int, duration: float):
+    with multiprocessing.get_context("spawn").Pool(clients) as pool:
+        results = pool.map(_client, [(url, token, concurrency, duration)] * clients)
+    latencies = [latency for result, _ in results for latency in result]
+    errors = sum(errors for _, errors in results)
+    cuts = statistics.quantiles(latencies, n=100)
+    return {
+        "requests_per_sec": round(len(latencies) / duration),
+        "p50_ms": round(cuts[49] * 1000, 2),
+        "p99_ms": round(cuts[98] * 1000, 2),
+        "errors": errors,
+    }
+
+
+def seed():
+    from benchmarks.export import seed as seed_items
+
+    seed_items(SEED_ROWS)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--database-url")
+    parser.add_argument("--step", choices=["seed"], help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.step == "seed":
+        return seed()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env.setdefault("ENVIRONMENT", "benchmark")
+        env.setdefault("SECRET_KEY", "benchmark-secret")
+        env["DATABASE_URL"] = args.database_url or f"sqlite:///{tmp}/scaling.db"
+        # Keep the log pipeline out of the measurement.
+        env["LOG_SUCCESS_SAMPLE_RATE"] = "0"
+        env["LOG_FILE"] = f"{tmp}/logs/app.log"
+        subprocess.run(
+            [sys.executable, "-m", "benchmarks.scaling", "--step=seed"],
+            env=env,
+            check=True,
+        )
+        os.environ.update(env)
+        from services.auth_service import create_access_token
+
+        token = create_access_token({"sub": "bench"})
+
+        results = {}
+        for workers in args.workers:
+            port = _free_port()
+            server = subprocess.Popen(
+                [sys.executable, "server.py"],
+                env={
+                    **env,
+                    "WEB_CONCURRENCY": str(workers),
+                    "WEB_BIND": f"127.0.0.1:{port}",
+                },
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            try:
+                url = f"http://127.0.0.1:{port}"
+                _wait_ready(url)
+                results[workers] = run_load(
+                    url, token, args.clients, args.concurrency, args.duration
+                )
+            finally:
+                server.send_signal(signal.SIGTERM)
+                server.wait(timeout=60)
+
+        baseline = results[min(results)]["requests_per_sec"] / min(results)
+        for workers, result in results.items():
+            result["efficiency"] = round(
+                result["requests_per_sec"] / (workers * baseline), 2
+            )
+        print(json.dumps({"cpus": os.cpu_count(), "workers": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Per-response serialization cost of the item routes, before and after.
+
+"before" is the generic FastAPI path the item routes used to take: validate
+the returned ORM row against the response model, run ``jsonable_encoder``
+over the result and ``json.dumps`` it in ``JSONResponse``. "after" is
+``utils.responses.serialize``: one ``from_attributes`` validation through a
+cached ``TypeAdapter`` and a direct dump to JSON bytes.
+
+No database is involved; rows are transient ORM instances.
+
+Usage:
+    python -m benchmarks.serialization --number 20000
+"""
+
+import argparse
+import os
+import timeit
+
+os.environ.setdefault("ENVIRONMENT", "benchmark")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from starlette.responses import JSONResponse  # noqa: E402
+
+from models import Category, Item as DBItem  # noqa: E402
+from schemas.item import ItemPage, ItemRead  # noqa: E402
+from utils.responses import JSONBytesResponse, serialize, type_adapter  # noqa: E402
+
+
+def _row(i: int) -> DBItem:
+    return DBItem(
+        id=i,
+        name=f"Cordless drill {i}",
+        description="18V cordless drill with two batteries and a charger",
+        price=12.5,
+        category=Category.TOOLS,
+        version=3,
+    )
+
+
+def _before(model, value) -> bytes:
+    validated = type_adapter(model).validate_python(value, from_attributes=True)
+    return JSONResponse(jsonable_encoder(validated)).body
+
+
+def _after(model, value) -> bytes:
+    return JSONBytesResponse(serialize(model, value)).body
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000)
+    parser.add_argument("--page-size", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    cases = {
+        "item": (ItemRead, _row(1)),
+        f"page[{args.page_size}]": (
+            ItemPage,
+            {"items": [_row(i) for i in range(args.page_size)], "next_cursor": 50},
+        ),
+    }
+    print(f"{'payload':<10} {'before us':>10} {'after us':>10} {'speedup':>8}")
+    for name, (model, value) in cases.items():
+        assert _before(model, value) == _after(model, value)
+        number = max(1, args.number // (args.page_size if model is ItemPage else 1))
+        before = min(
+            timeit.repeat(lambda: _before(model, value), number=number, repeat=3)
+        )
+        after = min(
+            timeit.repeat(lambda: _after(model, value), number=number, repeat=3)
+        )
+        before_us, after_us = before / number * 1e6, after / number * 1e6
+        print(
+            f"{name:<10} {before_us:>10.1f} {after_us:>10.1f} {before_us / after_us:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
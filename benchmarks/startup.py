@@ -0,0 +1,123 @@
+"""Cold-start budget: time from interpreter launch to "ready to serve".
+
+Each run starts a fresh ``python -X importtime`` process that imports
+``main`` and drives the ASGI lifespan startup (what uvicorn does before it
+accepts connections), against a database that is already at the current
+schema version. Reports the median of ``--runs`` runs, split into import
+and startup time, plus the slowest imports from the last run. Exits with
+status 1 if the median exceeds ``--budget`` seconds, so it can gate CI.
+
+Usage:
+    python -m benchmarks.startup --runs 5 --budget 2.0
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+_CHILD = """
+import asyncio, json, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+async def lifespan():
+    messages = iter([{"type": "lifespan.startup"}])
+    done = asyncio.Event()
+
+    async def receive():
+        try:
+            return next(messages)
+        except StopIteration:
+            await done.wait()
+            return {"type": "lifespan.shutdown"}
+
+    async def send(message):
+        if message["type"].startswith("lifespan.startup."):
+            done.set()
+            if message["type"] != "lifespan.startup.complete":
+                raise SystemExit(message.get("message", "startup failed"))
+
+    task = asyncio.ensure_future(main.app({"type": "lifespan"}, receive, send))
+    await done.wait()
+    task.cancel()
+
+asyncio.run(lifespan())
+ready = time.perf_counter()
+print(json.dumps({"import": imported - start, "startup": ready - imported}))
+"""
+
+
+def _importtime(stderr: str, top: int) -> list[dict]:
+    """Parse ``-X importtime`` output into the slowest cumulative imports."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.removeprefix("import time:").split("|")
+        rows.append(
+            {"module": name.strip(), "cumulative_ms": int(cumulative_us) / 1000}
+        )
+    rows.sort(key=lambda row: row["cumulative_ms"], reverse=True)
+    return rows[:top]
+
+
+def run_once(env: dict) -> tuple[dict, str]:
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _CHILD],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings["total"] = time.perf_counter() - start
+    return timings, result.stderr
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=2.0, help="seconds")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--database-url")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env.setdefault("ENVIRONMENT", "benchmark")
+        env.setdefault("SECRET_KEY", "benchmark-secret")
+        env["DATABASE_URL"] = args.database_url or f"sqlite:///{tmp}/startup.db"
+        env["LOG_FILE"] = f"{tmp}/logs/app.log"
+        env.setdefault("DB_POOL_WARMUP", "1")
+
+        # The first boot creates the schema; measure the boots after it.
+        run_once(env)
+        runs = [run_once(env) for _ in range(args.runs)]
+
+    median = {
+        phase: round(statistics.median(timings[phase] for timings, _ in runs), 3)
+        for phase in ("import", "startup", "total")
+    }
+    report = {
+        "median_seconds": median,
+        "budget_seconds": args.budget,
+        "slowest_imports": _importtime(runs[-1][1], args.top),
+    }
+    print(json.dumps(report, indent=2))
+    if median["total"] > args.budget:
+        print(
+            f"cold start {median['total']}s exceeds budget {args.budget}s",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
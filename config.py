@@ -1,3 +1,5 @@
+from typing import Optional
+from pydantic import Field
 from pydantic_settings import BaseSettings
 
 
@@ -6,12 +8,101 @@ class Settings(BaseSettings):
     database_url: str
     secret_key: str
     access_token_expire_minutes: int = 30
+    # Trust the user id, disabled flag and token version in access tokens
+    # instead of loading the user; revocations reach other workers within
+    # token_revocation_refresh_seconds
+    auth_stateless_tokens: bool = False
+    token_revocation_refresh_seconds: float = 5.0
+    # How far back each refresh re-reads, to catch revocations that commit
+    # after newer ones; should exceed the longest write transaction
+    token_revocation_overlap_seconds: float = 60.0
     app_name: str = "ToolShare"
+    # Logging: "json" lines or plain "text"; successful requests (status < 400)
+    # are logged with this probability, errors always
+    log_file: str = "logs/app.log"
+    log_level: str = "INFO"
+    log_format: str = "json"
+    log_success_sample_rate: float = 1.0
+    # Queries at or above slow_query_ms are logged (parameters redacted); a
+    # statement run n_plus_one_threshold times in one request is flagged
+    slow_query_ms: float = 200.0
+    n_plus_one_threshold: int = 10
+    # server.py (gunicorn + uvicorn workers); 0 workers means one per usable CPU
+    # with cache_url set, else one
+    web_bind: str = "0.0.0.0:8000"
+    web_concurrency: int = 0
+    web_preload: bool = True
+    # Seconds a worker gets after SIGTERM to finish in-flight requests
+    web_graceful_timeout: int = 30
+    # Schema written by `python -m utils.openapi`; generated on demand if absent
+    openapi_path: str = "openapi.json"
+    # Multi-worker metrics: each worker snapshots its registry into this
+    # directory every metrics_flush_interval seconds for /metrics to merge
+    metrics_dir: Optional[str] = None
+    metrics_flush_interval: float = 5.0
+    # Serve requests through an asyncio engine (asyncpg / aiosqlite) instead
+    # of the synchronous psycopg2 engine.
+    database_async: bool = False
+    # Run pending migrations at startup; turn off when a release command runs
+    # `alembic upgrade head` before the new version starts
+    migrate_on_startup: bool = True
+    # Connection pool, per worker process (server databases only; SQLite keeps
+    # SQLAlchemy's defaults). recycle is in seconds, -1 disables it.
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    # Connections opened at startup before serving; None means db_pool_size
+    db_pool_warmup: Optional[int] = None
+    # Behind pgbouncer in transaction mode: no server-side prepared statements
+    db_pgbouncer: bool = False
+    # Comma-separated read replica URLs for read-only routes, used round-robin.
+    # A client that wrote within replica_sticky_seconds reads from the primary.
+    database_replica_urls: Optional[str] = None
+    replica_sticky_seconds: float = 5.0
+    replica_sticky_clients: int = 100000
+    # bcrypt process pool; 0 workers means one per usable CPU, split between
+    # the server.py workers
+    hashing_workers: int = 0
+    hashing_max_pending: int = 64
+    # POST /auth/token token buckets, checked before the password; a burst
+    # of 0 turns that limit off, rates must be positive. Buckets are shared
+    # through cache_url if set.
+    login_ip_burst: int = 20
+    login_ip_per_minute: float = Field(default=20.0, gt=0)
+    login_user_burst: int = 5
+    login_user_per_minute: float = Field(default=5.0, gt=0)
+    login_throttle_keys: int = 100000
+    # Header the proxy puts the client address in (Fly-Client-IP on fly.io);
+    # the socket peer is used when unset
+    client_ip_header: Optional[str] = None
+    # Redis-compatible URL shared by all workers; in-process caches otherwise
+    cache_url: Optional[str] = None
+    # Authenticated users looked up by get_current_user
+    principal_cache_size: int = 10000
+    principal_cache_ttl: float = 60.0
+    # GET /items/items/{id} read-through cache
+    item_cache_size: int = 10000
+    item_cache_ttl: float = 30.0
+    # Seconds after an item write during which no worker refills its cache
+    # entry; must outlast any single item read
+    item_cache_refill_hold: float = 5.0
+    # GET /items/ page size; requests above the cap are rejected
+    items_page_size: int = 50
+    items_page_size_max: int = 200
+    # GET/POST /items/batch: most ids resolved in one request
+    items_batch_max: int = 100
+    # POST /items/bulk
+    bulk_import_batch_size: int = 1000
+    bulk_import_max_errors: int = 1000
+    bulk_import_max_line_bytes: int = 65536
+    # GET /items/export rows fetched per server-side cursor round trip
+    export_batch_size: int = 1000
 
     class Config:
         env_file = ".env"  # Only for local development
-        env_file_encoding = 'utf-8'
+        env_file_encoding = "utf-8"
 
 
 settings = Settings()
-
@@ -1,12 +1,12 @@
 from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from jose import JWTError, jwt
 from config import settings
 from schemas.auth import TokenData
-from services.auth_service import get_user
-from dependencies.db import get_db
-from models import User
+from schemas.user import Principal
+from services.auth_service import get_user, get_user_async, principal_cache
+from services.token_revocation import revocations
+from dependencies.db import DBSession, get_read_db, run_db
+from utils.cache import cache_get, cache_set
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
@@ -15,13 +15,16 @@ ALGORITHM = "HS256"
 
 
 async def get_current_user(
-    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
+    token: str = Depends(oauth2_scheme), db: DBSession = Depends(get_read_db)
 ):
     credentials_exception = HTTPException(
         status_code=401,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    # Imported on first use to keep python-jose out of process startup.
+    from jose import JWTError, jwt
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -30,14 +33,31 @@ async def get_current_user(
         token_data = TokenData(username=username)
     except JWTError:
         raise credentials_exception
-    user = get_user(db, username=token_data.username)
+    # Tokens issued before claims were added carry neither; they expire soon.
+    user_id, version = payload.get("uid"), payload.get("ver")
+    if user_id is not None and version is not None:
+        if revocations.is_revoked(user_id, version):
+            raise credentials_exception
+        if settings.auth_stateless_tokens:
+            return Principal(
+                id=user_id,
+                username=token_data.username,
+                disabled=payload.get("disabled", False),
+            )
+    cached = await cache_get(principal_cache, token_data.username)
+    if cached is not None:
+        return Principal(**cached)
+    user = await run_db(db, get_user, get_user_async, token_data.username)
     if user is None:
         raise credentials_exception
-    return user
+    principal = Principal.model_validate(user)
+    await cache_set(principal_cache, token_data.username, principal.model_dump())
+    return principal
 
 
-async def get_current_active_user(current_user: User = Depends(get_current_user)):
-    current_user.disabled = False
+async def get_current_active_user(
+    current_user: Principal = Depends(get_current_user),
+):
     if current_user.disabled:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
@@ -1,13 +1,101 @@
+import hashlib
+import itertools
+from typing import Union
+from fastapi import Depends, Request
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from database import SessionLocal
+from starlette.concurrency import run_in_threadpool
+from config import settings
+from dependencies.rate_limit import client_ip
+from utils.cache import build_cache, cache_get, cache_set
+import database
 import logging
 
 logger = logging.getLogger(__name__)
 
+DBSession = Union[Session, AsyncSession]
 
-def get_db():
-    db: Session = SessionLocal()
+
+def get_sync_db():
+    db: Session = database.SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with database.AsyncSessionLocal() as db:
+        yield db
+
+
+get_db = get_async_db if settings.database_async else get_sync_db
+
+# Clients that wrote recently; entries expire after the stickiness window.
+recent_writers = build_cache(
+    "recent-writer",
+    settings.replica_sticky_clients,
+    settings.replica_sticky_seconds,
+    settings.cache_url,
+)
+_replica_turn = itertools.count()
+
+
+def _client_keys(request: Request) -> list[str]:
+    # The address covers requests made before a token was issued (register,
+    # login); the token covers clients whose address changes.
+    keys = [f"ip:{client_ip(request)}"]
+    authorization = request.headers.get("authorization")
+    if authorization:
+        digest = hashlib.sha256(authorization.encode()).hexdigest()[:32]
+        keys.append(f"token:{digest}")
+    return keys
+
+
+async def get_write_db(request: Request, db: DBSession = Depends(get_db)):
+    """Primary session for routes that write; pins the client to the primary.
+
+    For the next ``settings.replica_sticky_seconds`` the client's reads go
+    to the primary too, so it sees its own writes despite replication lag.
+    """
+    if database.ReplicaSessionLocals:
+        for key in _client_keys(request):
+            await cache_set(recent_writers, key, True)
+    return db
+
+
+async def get_read_db(request: Request, primary: DBSession = Depends(get_db)):
+    """Session for read-only routes: a replica, round-robin, when configured.
+
+    Falls back to the primary (``get_db``) when there are no replicas or the
+    client wrote recently. The unused primary session never connects.
+    """
+    replicas = database.ReplicaSessionLocals
+    if not replicas:
+        yield primary
+        return
+    for key in _client_keys(request):
+        if await cache_get(recent_writers, key):
+            yield primary
+            return
+    db = replicas[next(_replica_turn) % len(replicas)]()
+    # Lets services keep possibly lagging rows out of shared caches.
+    db.info["replica"] = True
+    try:
+        yield db
+    finally:
+        if isinstance(db, AsyncSession):
+            await db.close()
+        else:
+            await run_in_threadpool(db.close)
+
+
+async def run_db(db: DBSession, sync_fn, async_fn, *args, **kwargs):
+    """Call the service variant matching the session without blocking the loop.
+
+    Async sessions are awaited directly; sync sessions run the blocking
+    service in the threadpool, as FastAPI does for plain ``def`` routes.
+    """
+    if isinstance(db, AsyncSession):
+        return await async_fn(db, *args, **kwargs)
+    return await run_in_threadpool(sync_fn, db, *args, **kwargs)
@@ -1,32 +1,19 @@
 import logging
-from logging.handlers import RotatingFileHandler
-from fastapi import FastAPI, Request
-from database import init_db
-from routers import auth, items, users
+from fastapi import FastAPI
+from starlette.concurrency import run_in_threadpool
+from database import init_db, warm_up_async_pool, warm_up_pool
+from services.hashing import hashing_pool
+from services.token_revocation import start_refresher, stop_refresher
+from routers import auth, items, metrics, users
 from config import settings
+from utils.logging import setup_logging, shutdown_logging
+from utils.metrics import start_flusher, stop_flusher
+from utils.middleware import RequestContextMiddleware
+from utils.openapi import use_precomputed
 
-# Configure logging
-log_formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-
-# File handler: Logs to a file with rotation
-file_handler = RotatingFileHandler(
-    "logs/app.log", maxBytes=1000000, backupCount=3
-)
-file_handler.setFormatter(log_formatter)
-
-# Stream handler: Logs to stdout for Docker logs
-console_handler = logging.StreamHandler()
-console_handler.setFormatter(log_formatter)
-
-# Add handlers to logger
-logging.basicConfig(
-    level=logging.INFO,
-    handlers=[file_handler, console_handler],
-)
-
+# File and console output happen on a background thread
+setup_logging()
 logger = logging.getLogger(__name__)
-logger.info("Test log message to verify file and console output")
-
 
 
 app = FastAPI(
@@ -36,22 +23,54 @@ app = FastAPI(
 )
 
 
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    logger.info(f"Request: {request.method} {request.url}")
-    response = await call_next(request)
-    logger.info(f"Response: {response.status_code}")
-    print(f"Middleware triggered for {request.method} {request.url}")
-    return response
+app.add_middleware(RequestContextMiddleware)
+use_precomputed(app, settings.openapi_path)
 
 
 # Include routers
 app.include_router(auth.router, prefix="/auth", tags=["Authentication"])
 app.include_router(users.router, prefix="/users", tags=["Users"])
 app.include_router(items.router, prefix="/items", tags=["Items"])
+app.include_router(metrics.router)
 
 
 @app.on_event("startup")
 def on_startup():
     logger.info("Initializing database")
     init_db()
+
+
+@app.on_event("startup")
+async def on_startup_warm_up_pool():
+    # Startup completes before the server accepts connections.
+    if settings.database_async:
+        opened = await warm_up_async_pool()
+    else:
+        opened = await run_in_threadpool(warm_up_pool)
+    logger.info("Opened %d database connections", opened)
+
+
+@app.on_event("startup")
+async def on_startup_metrics():
+    start_flusher()
+
+
+@app.on_event("startup")
+async def on_startup_revocations():
+    await start_refresher()
+
+
+@app.on_event("shutdown")
+async def on_shutdown_metrics():
+    await stop_flusher()
+
+
+@app.on_event("shutdown")
+def on_shutdown_revocations():
+    stop_refresher()
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    hashing_pool.shutdown()
+    shutdown_logging()
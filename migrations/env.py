@@ -0,0 +1,71 @@
+"""Alembic environment.
+
+Runs against ``settings.database_url`` with the sync driver, unless the
+caller passes another URL in ``config.attributes["url"]`` (see
+``database.run_migrations``). Every migration gets its own transaction so
+that ``autocommit_block`` works for ``CONCURRENTLY`` operations. On Postgres
+a session advisory lock serialises concurrent runs (several machines or
+workers booting at once).
+"""
+
+from alembic import context
+from sqlalchemy import create_engine, pool, text
+from config import settings
+from migrations.helpers import include_for_dialect
+from models import Base
+
+config = context.config
+target_metadata = Base.metadata
+
+# Arbitrary, but must stay the same across releases.
+MIGRATION_LOCK_ID = 74_616_101
+
+
+def _url() -> str:
+    return config.attributes.get("url") or settings.database_url
+
+
+def run_migrations_offline():
+    context.configure(
+        url=_url(),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        transaction_per_migration=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    engine = create_engine(_url(), poolclass=pool.NullPool)
+    with engine.connect() as connection:
+        postgres = connection.dialect.name == "postgresql"
+        if postgres:
+            connection.execute(
+                text("SELECT pg_advisory_lock(:id)"), {"id": MIGRATION_LOCK_ID}
+            )
+            connection.commit()
+        try:
+            context.configure(
+                connection=connection,
+                target_metadata=target_metadata,
+                transaction_per_migration=True,
+                # SQLite cannot ALTER most things in place.
+                render_as_batch=connection.dialect.name == "sqlite",
+                include_object=include_for_dialect(connection.dialect.name),
+            )
+            with context.begin_transaction():
+                context.run_migrations()
+        finally:
+            if postgres:
+                connection.execute(
+                    text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATION_LOCK_ID}
+                )
+                connection.commit()
+    engine.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
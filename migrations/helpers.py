@@ -0,0 +1,112 @@
+"""Operations for migrating a live database without long locks.
+
+On Postgres indexes are built and dropped ``CONCURRENTLY`` (outside the
+migration's transaction), and large updates run in key-ordered batches that
+each commit on their own. Other backends get the plain equivalents.
+
+Remember to bump ``models.SCHEMA_REVISION`` with every new migration.
+"""
+
+from typing import Optional
+from alembic import op
+import sqlalchemy as sa
+
+
+def is_postgres() -> bool:
+    return op.get_bind().dialect.name == "postgresql"
+
+
+def include_for_dialect(dialect: str):
+    """Autogenerate ``include_object`` hook honouring the models' ``ddl_if``.
+
+    Autogenerate ignores ``ddl_if``, so without this a Postgres-only index
+    reads as missing on every other backend.
+    """
+
+    def include_object(obj, name, type_, reflected, compare_to):
+        ddl_if = getattr(obj, "_ddl_if", None)
+        if ddl_if is None or ddl_if.dialect is None:
+            return True
+        wanted = ddl_if.dialect
+        return dialect in ((wanted,) if isinstance(wanted, str) else wanted)
+
+    return include_object
+
+
+def _drop_invalid_index(name: str):
+    # A failed CONCURRENTLY build leaves an INVALID index behind, which
+    # IF NOT EXISTS would then mistake for a finished one.
+    invalid = (
+        op.get_bind()
+        .execute(
+            sa.text(
+                "SELECT 1 FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid "
+                "WHERE c.relname = :name AND NOT i.indisvalid"
+            ),
+            {"name": name},
+        )
+        .first()
+    )
+    if invalid:
+        op.drop_index(name, postgresql_concurrently=True, if_exists=True)
+
+
+def create_index_concurrently(name: str, table: str, columns: list, **kw):
+    """Create an index without blocking writes; a no-op if it already exists."""
+    if not is_postgres():
+        op.create_index(name, table, columns, if_not_exists=True, **kw)
+        return
+    with op.get_context().autocommit_block():
+        _drop_invalid_index(name)
+        op.create_index(
+            name,
+            table,
+            columns,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+            **kw,
+        )
+
+
+def drop_index_concurrently(name: str, table: str):
+    """Drop an index without blocking reads or writes, if it exists."""
+    if not is_postgres():
+        op.drop_index(name, table_name=table, if_exists=True)
+        return
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            name, table_name=table, postgresql_concurrently=True, if_exists=True
+        )
+
+
+def backfill_in_batches(
+    table: sa.TableClause,
+    values: dict,
+    where: Optional[sa.ColumnElement] = None,
+    batch_size: int = 5000,
+) -> int:
+    """``UPDATE table SET values WHERE where``, ``batch_size`` ids at a time.
+
+    Each batch is its own transaction, so row locks are held briefly and
+    progress survives an interruption (re-running resumes, provided
+    ``where`` excludes rows already done). Returns the rows updated.
+    """
+    bind = op.get_bind()
+    key = table.c.id
+    updated = 0
+    last = None
+    with op.get_context().autocommit_block():
+        while True:
+            window = sa.select(key).order_by(key).limit(batch_size)
+            if last is not None:
+                window = window.where(key > last)
+            upper = bind.scalar(sa.select(sa.func.max(window.subquery().c.id)))
+            if upper is None:
+                return updated
+            statement = sa.update(table).where(key <= upper).values(**values)
+            if last is not None:
+                statement = statement.where(key > last)
+            if where is not None:
+                statement = statement.where(where)
+            updated += bind.execute(statement).rowcount
+            last = upper
@@ -0,0 +1,52 @@
+"""Baseline: the users and items tables as create_all used to make them
+
+Databases created before migrations existed already have these tables, so
+each one is only created when missing.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if "users" not in tables:
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("username", sa.String()),
+            sa.Column("email", sa.String()),
+            sa.Column("full_name", sa.String()),
+            sa.Column("hashed_password", sa.String()),
+            sa.Column("disabled", sa.String()),
+        )
+        op.create_index("ix_users_id", "users", ["id"])
+        op.create_index("ix_users_username", "users", ["username"], unique=True)
+        op.create_index("ix_users_email", "users", ["email"], unique=True)
+    if "items" not in tables:
+        op.create_table(
+            "items",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("name", sa.String()),
+            sa.Column("description", sa.String(), nullable=True),
+            sa.Column("price", sa.Float()),
+            sa.Column("category", sa.Enum("TOOLS", "SERVICE", name="category")),
+        )
+        op.create_index("ix_items_id", "items", ["id"])
+        op.create_index("ix_items_name", "items", ["name"])
+        op.create_index("ix_items_description", "items", ["description"])
+
+
+def downgrade():
+    op.drop_table("items")
+    op.drop_table("users")
+    sa.Enum(name="category").drop(op.get_bind(), checkfirst=True)
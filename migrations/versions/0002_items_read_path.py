@@ -0,0 +1,93 @@
+"""items: version and search_vector columns, pagination and search indexes
+
+Brings databases created before migrations up to the current models:
+adds the optimistic-concurrency version and the full-text search vector,
+drops the unused description B-tree and adds the keyset pagination and GIN
+search indexes. On Postgres the indexes are built concurrently and existing
+rows get their search vector in batches, so the table stays writable.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from migrations.helpers import (
+    backfill_in_batches,
+    create_index_concurrently,
+    drop_index_concurrently,
+    is_postgres,
+)
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+# Frozen copy of services.item_service.search_vector_expr at this revision.
+SEARCH_CONFIG = "english"
+
+items = sa.table(
+    "items",
+    sa.column("id", sa.Integer),
+    sa.column("name", sa.String),
+    sa.column("description", sa.String),
+    sa.column("search_vector"),
+)
+
+
+def _search_vector():
+    def weighted(column, weight):
+        return sa.func.setweight(
+            sa.func.to_tsvector(SEARCH_CONFIG, sa.func.coalesce(column, "")),
+            sa.literal_column(f"'{weight}'"),
+        )
+
+    return weighted(items.c.name, "A").op("||")(weighted(items.c.description, "B"))
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    columns = {column["name"] for column in inspector.get_columns("items")}
+    if "version" not in columns:
+        # A constant default is a catalogue-only change on Postgres 11+.
+        op.add_column(
+            "items",
+            sa.Column("version", sa.Integer(), nullable=False, server_default="1"),
+        )
+    if "search_vector" not in columns:
+        op.add_column(
+            "items",
+            sa.Column(
+                "search_vector",
+                sa.String().with_variant(TSVECTOR(), "postgresql"),
+                nullable=True,
+            ),
+        )
+
+    drop_index_concurrently("ix_items_description", "items")
+    create_index_concurrently("ix_items_category_id", "items", ["category", "id"])
+    create_index_concurrently("ix_items_price_id", "items", ["price", "id"])
+    # Like the model's index, the search vector only exists on Postgres.
+    if is_postgres():
+        backfill_in_batches(
+            items,
+            {"search_vector": _search_vector()},
+            where=items.c.search_vector.is_(None),
+        )
+        create_index_concurrently(
+            "ix_items_search_vector", "items", ["search_vector"], postgresql_using="gin"
+        )
+
+
+def downgrade():
+    drop_index_concurrently("ix_items_search_vector", "items")
+    drop_index_concurrently("ix_items_price_id", "items")
+    drop_index_concurrently("ix_items_category_id", "items")
+    create_index_concurrently("ix_items_description", "items", ["description"])
+    with op.batch_alter_table("items") as batch:
+        batch.drop_column("search_vector")
+        batch.drop_column("version")
@@ -0,0 +1,42 @@
+"""users.token_version and the token_revocations log
+
+Access tokens carry the user's token version; a revocation bumps it and
+appends a row that every worker picks up. The new column has a constant
+default, so adding it does not rewrite users on Postgres 11+.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "users",
+        sa.Column("token_version", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.create_table(
+        "token_revocations",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("token_version", sa.Integer(), nullable=False),
+        sa.Column("revoked_at", sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index(
+        "ix_token_revocations_revoked_at", "token_revocations", ["revoked_at"]
+    )
+
+
+def downgrade():
+    op.drop_index("ix_token_revocations_revoked_at", "token_revocations")
+    op.drop_table("token_revocations")
+    with op.batch_alter_table("users") as batch:
+        batch.drop_column("token_version")
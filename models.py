@@ -1,9 +1,25 @@
 from enum import Enum
-from sqlalchemy import Column, Integer, String, Float, Enum as SqlEnum
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Enum as SqlEnum,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+)
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import deferred
 
 Base = declarative_base()
 
+# Latest migration in migrations/versions. Startup compares it with the
+# database's alembic_version without importing alembic; bump it with every
+# new migration.
+SCHEMA_REVISION = "0003"
+
 
 class Category(Enum):
     TOOLS = "tools"
@@ -15,9 +31,29 @@ class Item(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
-    description = Column(String, index=True, nullable=True)
+    description = Column(String, nullable=True)
     price = Column(Float)
     category = Column(SqlEnum(Category))
+    # Bumped by every update; exposed as the ETag for optimistic concurrency
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    # Weighted name/description lexemes, maintained by item_service. Only
+    # populated on Postgres; other backends search an in-process index.
+    # Deferred so ordinary item reads never ship the vector.
+    search_vector = deferred(
+        Column(String().with_variant(TSVECTOR(), "postgresql"), nullable=True)
+    )
+
+    # Keyset pagination walks id in order. (category, id) serves a category
+    # page as an index range already in id order. A price range is not in id
+    # order, so (price, id) only narrows the rows a price-filtered page sorts:
+    # its cost grows with the number of items in the range, not the page size.
+    __table_args__ = (
+        Index("ix_items_category_id", "category", "id"),
+        Index("ix_items_price_id", "price", "id"),
+        Index("ix_items_search_vector", "search_vector", postgresql_using="gin").ddl_if(
+            dialect="postgresql"
+        ),
+    )
 
 
 class User(Base):
@@ -29,3 +65,16 @@ class User(Base):
     full_name = Column(String)
     hashed_password = Column(String)
     disabled = Column(String)
+    # Carried in access tokens; bumping it revokes every token issued before.
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
+
+
+class TokenRevocation(Base):
+    """Append-only log of token_version bumps, tailed by every worker."""
+
+    __tablename__ = "token_revocations"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    token_version = Column(Integer, nullable=False)
+    revoked_at = Column(DateTime(timezone=True), nullable=False, index=True)
@@ -1,12 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
+from typing import Annotated
 from schemas.auth import Token
-from dependencies.db import get_db
-from services.auth_service import authenticate_user, create_access_token
+from dependencies.auth import get_current_user
+from dependencies.db import DBSession, get_db, get_write_db, run_db
+from dependencies.rate_limit import throttle_login
+from services.auth_service import (
+    create_access_token,
+    get_user,
+    get_user_async,
+    token_claims,
+    verify_password_async,
+)
+from services.token_revocation import revoke_tokens, revoke_tokens_async
+from schemas.user import Principal
 from datetime import timedelta
 from config import settings
 from fastapi.security import OAuth2PasswordRequestForm
 import logging
-from sqlalchemy.orm import Session
 
 logger = logging.getLogger(__name__)
 
@@ -37,14 +47,42 @@ router = APIRouter()
                 }
             },
         },
+        429: {
+            "description": "Too many attempts from this client or for this user.",
+            "headers": {
+                "Retry-After": {
+                    "description": "Seconds until the next attempt is allowed",
+                    "schema": {"type": "integer"},
+                }
+            },
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Too many login attempts, please retry later"}
+                }
+            },
+        },
+        503: {
+            "description": "Password hashing capacity exhausted; retry later.",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "detail": "Authentication service is busy, please retry"
+                    }
+                }
+            },
+        },
     },
 )
 async def login_for_access_token(
-    form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    _throttle: None = Depends(throttle_login),
+    db: DBSession = Depends(get_db),
 ):
     logger.info("Attempting to authenticate user")
-    user = authenticate_user(db, form_data.username, form_data.password)
-    if not user:
+    user = await run_db(db, get_user, get_user_async, form_data.username)
+    if not user or not await verify_password_async(
+        form_data.password, user.hashed_password
+    ):
         logger.error("Authentication failed for user: %s", form_data.username)
         raise HTTPException(
             status_code=401,
@@ -53,7 +91,32 @@ async def login_for_access_token(
         )
     access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data=token_claims(user), expires_delta=access_token_expires
     )
     logger.info("User authenticated successfully: %s", user.username)
     return {"access_token": access_token, "token_type": "bearer"}
+
+
+@router.post(
+    "/logout",
+    status_code=204,
+    description="Revoke every access token issued to the current user.",
+    responses={
+        204: {"description": "Tokens revoked; log in again for a new one."},
+        401: {
+            "description": "Missing, invalid or already revoked token.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Could not validate credentials"}
+                }
+            },
+        },
+    },
+)
+async def logout(
+    current_user: Annotated[Principal, Depends(get_current_user)],
+    db: DBSession = Depends(get_write_db),
+):
+    await run_db(db, revoke_tokens, revoke_tokens_async, current_user.id)
+    logger.info("Revoked tokens for user: %s", current_user.username)
+    return Response(status_code=204)
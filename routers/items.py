@@ -1,22 +1,106 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import Annotated
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Annotated, Literal, Optional
+from config import settings
 from dependencies.auth import get_current_active_user, get_current_user
-from dependencies.db import get_db
-from schemas.item import Item, ItemUpdate
+from dependencies.db import DBSession, get_read_db, get_write_db, run_db
+from models import Category
+from schemas.item import (
+    ITEM_ID_MAX,
+    BulkImportReport,
+    Item,
+    ItemBatch,
+    ItemBatchRequest,
+    ItemPage,
+    ItemRead,
+    ItemSearchPage,
+    ItemUpdate,
+)
+from services.item_export import (
+    MEDIA_TYPES,
+    export_items,
+    export_items_async,
+    gzip_chunks,
+    gzip_chunks_async,
+)
+from services.item_import import (
+    CSV_TYPES,
+    NDJSON_TYPES,
+    import_items,
+    insert_items_batch,
+    insert_items_batch_async,
+    iter_lines,
+    parse_csv,
+    parse_ndjson,
+)
 from services.item_service import (
     add_item_service,
+    add_item_service_async,
+    list_items_service,
+    list_items_service_async,
+    search_items_service,
+    search_items_service_async,
     update_item_service,
+    update_item_service_async,
     get_item_by_id_service,
+    get_item_by_id_service_async,
+    get_items_by_ids_service,
+    get_items_by_ids_service_async,
+    get_item_version_service,
+    get_item_version_service_async,
     delete_item_service,
+    delete_item_service_async,
 )
 from schemas.user import User
+from utils.responses import JSONBytesResponse, serialize
 
 router = APIRouter(tags=["Items"])
 
+# Envelope used by the write routes, e.g. {"added": {...}}
+ItemEnvelope = dict[str, ItemRead]
+
+PRECONDITION_FAILED_RESPONSE = {
+    "description": "If-Match did not name the item's current version.",
+    "content": {
+        "application/json": {"example": {"detail": "Item with id=1 has been modified"}}
+    },
+}
+
+
+def item_etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def parse_if_match(if_match: Optional[str]) -> Optional[list[int]]:
+    """Versions named by an If-Match header; None means unconditional.
+
+    Weak or foreign tags can never match, so they are dropped; a header
+    made only of those yields an empty list and the write gets a 412.
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+    versions = []
+    for tag in if_match.split(","):
+        tag = tag.strip()
+        if len(tag) > 2 and tag[0] == tag[-1] == '"' and tag[1:-1].isdigit():
+            versions.append(int(tag[1:-1]))
+    return versions
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison, as If-None-Match requires."""
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(",")
+    )
+
 
 @router.post(
     "/",
+    response_model=ItemEnvelope,
+    response_class=JSONBytesResponse,
     description="Add a new item to the system. The user must be authenticated.",
     responses={
         200: {
@@ -30,6 +114,7 @@ router = APIRouter(tags=["Items"])
                             "description": "A useful tool for construction.",
                             "price": 10.0,
                             "category": "tools",
+                            "version": 1,
                         }
                     }
                 }
@@ -43,18 +128,323 @@ router = APIRouter(tags=["Items"])
         },
     },
 )
-def add_item(
+async def add_item(
     item: Item,
     current_user: Annotated[User, Depends(get_current_user)],
-    db: Session = Depends(get_db),
-) -> dict[str, Item]:
-    new_item = add_item_service(db, item)
-    return {"added": new_item}
+    db: DBSession = Depends(get_write_db),
+) -> Response:
+    new_item = await run_db(db, add_item_service, add_item_service_async, item)
+    return JSONBytesResponse(serialize(ItemEnvelope, {"added": new_item}))
+
+
+@router.post(
+    "/bulk",
+    response_model=BulkImportReport,
+    description=(
+        "Import many items from a streamed NDJSON (`application/x-ndjson`, one "
+        "item object per line) or CSV (`text/csv`, with a header row) body. "
+        "Valid rows are inserted in batches; invalid rows are reported and skipped."
+    ),
+    responses={
+        200: {
+            "description": "Import finished; see the per-row error report.",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "inserted": 2,
+                        "failed": 1,
+                        "errors": [{"row": 3, "error": "price: Field required"}],
+                        "errors_truncated": False,
+                    }
+                }
+            },
+        },
+        415: {
+            "description": "Unsupported content type.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Expected application/x-ndjson or text/csv"}
+                }
+            },
+        },
+    },
+)
+async def bulk_import_items(
+    request: Request,
+    current_user: Annotated[User, Depends(get_current_user)],
+    db: DBSession = Depends(get_write_db),
+) -> BulkImportReport:
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    max_line_bytes = settings.bulk_import_max_line_bytes
+    lines = iter_lines(request.stream(), max_line_bytes)
+    if content_type in NDJSON_TYPES:
+        records = parse_ndjson(lines)
+    elif content_type in CSV_TYPES:
+        records = parse_csv(lines, max_line_bytes)
+    else:
+        raise HTTPException(
+            status_code=415, detail="Expected application/x-ndjson or text/csv"
+        )
+    return await import_items(
+        records,
+        lambda batch: run_db(db, insert_items_batch, insert_items_batch_async, batch),
+        settings.bulk_import_batch_size,
+        settings.bulk_import_max_errors,
+    )
+
+
+def _accepts_gzip(request: Request) -> bool:
+    for coding in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = coding.strip().partition(";")
+        if name.strip() == "gzip":
+            return params.replace(" ", "") not in ("q=0", "q=0.0")
+    return False
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    description=(
+        "Stream every item as NDJSON or CSV, ordered by id. The body is "
+        "gzip-compressed when the client sends `Accept-Encoding: gzip`."
+    ),
+    responses={
+        200: {
+            "description": "The items table, streamed.",
+            "content": {
+                "application/x-ndjson": {
+                    "example": '{"id": 1, "name": "Hammer", "description": null, '
+                    '"price": 10.0, "category": "tools"}\n'
+                },
+                "text/csv": {
+                    "example": "id,name,description,price,category\r\n"
+                    "1,Hammer,,10.0,tools\r\n"
+                },
+            },
+        },
+    },
+)
+async def export_items_stream(
+    request: Request,
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    fmt: Literal["ndjson", "csv"] = Query(default="ndjson", alias="format"),
+    db: DBSession = Depends(get_read_db),
+):
+    gzip = _accepts_gzip(request)
+    if isinstance(db, AsyncSession):
+        body = export_items_async(db, fmt, settings.export_batch_size)
+        body = gzip_chunks_async(body) if gzip else body
+    else:
+        body = export_items(db, fmt, settings.export_batch_size)
+        body = gzip_chunks(body) if gzip else body
+    headers = {
+        "Content-Disposition": f'attachment; filename="items.{fmt}"',
+        "Vary": "Accept-Encoding",
+    }
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(body, media_type=MEDIA_TYPES[fmt], headers=headers)
+
+
+@router.get(
+    "/",
+    response_model=ItemPage,
+    response_class=JSONBytesResponse,
+    description=(
+        "List items ordered by id, optionally filtered by category and price. "
+        "Pass the returned `next_cursor` as `cursor` to fetch the next page. "
+        "A page filtered by price costs time in proportion to the items in "
+        "the price range, not the page size."
+    ),
+    responses={
+        200: {
+            "description": "A page of items.",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "items": [
+                            {
+                                "id": 1,
+                                "name": "Hammer",
+                                "description": "A tool for hitting nails.",
+                                "price": 10.0,
+                                "category": "tools",
+                                "version": 1,
+                            }
+                        ],
+                        "next_cursor": 1,
+                    }
+                }
+            },
+        },
+    },
+)
+async def list_items(
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    cursor: Optional[int] = Query(
+        default=None, description="Return items with an id greater than this"
+    ),
+    limit: int = Query(
+        default=settings.items_page_size, ge=1, le=settings.items_page_size_max
+    ),
+    category: Optional[Category] = None,
+    min_price: Optional[float] = Query(default=None, ge=0),
+    max_price: Optional[float] = Query(default=None, ge=0),
+    db: DBSession = Depends(get_read_db),
+) -> Response:
+    page = await run_db(
+        db,
+        list_items_service,
+        list_items_service_async,
+        cursor,
+        limit,
+        category,
+        min_price,
+        max_price,
+    )
+    return JSONBytesResponse(serialize(ItemPage, page))
+
+
+@router.get(
+    "/search",
+    response_model=ItemSearchPage,
+    response_class=JSONBytesResponse,
+    description=(
+        "Full-text search over item names and descriptions, best matches first. "
+        "Every search term must match; name matches rank above description matches."
+    ),
+    responses={
+        200: {
+            "description": "A page of matching items.",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "items": [
+                            {
+                                "id": 1,
+                                "name": "Hammer",
+                                "description": "A tool for hitting nails.",
+                                "price": 10.0,
+                                "category": "tools",
+                                "version": 1,
+                                "rank": 0.6,
+                            }
+                        ],
+                        "next_offset": None,
+                    }
+                }
+            },
+        },
+    },
+)
+async def search_items(
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    q: str = Query(min_length=1, max_length=200, description="Search terms"),
+    offset: int = Query(default=0, ge=0),
+    limit: int = Query(
+        default=settings.items_page_size, ge=1, le=settings.items_page_size_max
+    ),
+    db: DBSession = Depends(get_read_db),
+) -> Response:
+    page = await run_db(
+        db, search_items_service, search_items_service_async, q, offset, limit
+    )
+    return JSONBytesResponse(serialize(ItemSearchPage, page))
+
+
+BATCH_RESPONSES = {
+    200: {
+        "description": "The items found, in request order, and the ids that were not.",
+        "content": {
+            "application/json": {
+                "example": {
+                    "items": [
+                        {
+                            "id": 3,
+                            "name": "Hammer",
+                            "description": "A tool for hitting nails.",
+                            "price": 10.0,
+                            "category": "tools",
+                            "version": 1,
+                        }
+                    ],
+                    "missing": [7],
+                }
+            }
+        },
+    },
+    422: {
+        "description": "Malformed ids or more than the batch limit.",
+        "content": {
+            "application/json": {"example": {"detail": "At most 100 ids per batch"}}
+        },
+    },
+}
+
+
+def batch_ids(ids: list[int]) -> list[int]:
+    """``ids`` without repeats, first occurrence first, within the batch cap."""
+    unique = list(dict.fromkeys(ids))
+    if len(unique) > settings.items_batch_max:
+        raise HTTPException(
+            status_code=422,
+            detail=f"At most {settings.items_batch_max} ids per batch",
+        )
+    return unique
+
+
+async def _item_batch(ids: list[int], db: DBSession) -> Response:
+    batch = await run_db(
+        db, get_items_by_ids_service, get_items_by_ids_service_async, batch_ids(ids)
+    )
+    return JSONBytesResponse(serialize(ItemBatch, batch))
+
+
+@router.get(
+    "/batch",
+    response_model=ItemBatch,
+    response_class=JSONBytesResponse,
+    description=(
+        "Retrieve several items by id in one request, e.g. `?ids=3,7,1`. "
+        "Ids that do not exist are listed in `missing`."
+    ),
+    responses=BATCH_RESPONSES,
+)
+async def get_items_batch(
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    ids: list[str] = Query(description="Comma-separated or repeated item ids"),
+    db: DBSession = Depends(get_read_db),
+) -> Response:
+    try:
+        item_ids = [int(i) for value in ids for i in value.split(",") if i.strip()]
+    except ValueError:
+        raise HTTPException(status_code=422, detail="ids must be integers")
+    if not item_ids:
+        raise HTTPException(status_code=422, detail="ids must not be empty")
+    if any(not -ITEM_ID_MAX - 1 <= i <= ITEM_ID_MAX for i in item_ids):
+        raise HTTPException(status_code=422, detail="ids out of range")
+    return await _item_batch(item_ids, db)
+
+
+@router.post(
+    "/batch",
+    response_model=ItemBatch,
+    response_class=JSONBytesResponse,
+    description="Like `GET /items/batch`, for id lists too long for a URL.",
+    responses=BATCH_RESPONSES,
+)
+async def post_items_batch(
+    batch: ItemBatchRequest,
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    db: DBSession = Depends(get_read_db),
+) -> Response:
+    return await _item_batch(batch.ids, db)
 
 
 @router.get(
     "/items/{item_id}",
-    response_model=Item,
+    response_model=ItemRead,
+    response_class=JSONBytesResponse,
     description="Retrieve the details of an item by its unique ID.",
     responses={
         200: {
@@ -67,10 +457,12 @@ def add_item(
                         "description": "A tool for hitting nails.",
                         "price": 10.0,
                         "category": "tools",
+                        "version": 1,
                     }
                 }
             },
         },
+        304: {"description": "Item unchanged since the ETag in If-None-Match."},
         404: {
             "description": "Item not found.",
             "content": {
@@ -79,17 +471,34 @@ def add_item(
         },
     },
 )
-def get_item_by_id(
+async def get_item_by_id(
     item_id: int,
     current_user: Annotated[User, Depends(get_current_active_user)],
-    db: Session = Depends(get_db),
-) -> Item:
-    db_item = get_item_by_id_service(db, item_id)
-    return db_item
+    if_none_match: Optional[str] = Header(
+        default=None, description="ETag(s) the client already holds"
+    ),
+    db: DBSession = Depends(get_read_db),
+) -> Response:
+    if if_none_match is not None:
+        # Revalidate against the version alone; the row is only loaded and
+        # serialized when it actually changed.
+        version = await run_db(
+            db, get_item_version_service, get_item_version_service_async, item_id
+        )
+        if etag_matches(if_none_match, item_etag(version)):
+            return Response(status_code=304, headers={"ETag": item_etag(version)})
+    db_item = await run_db(
+        db, get_item_by_id_service, get_item_by_id_service_async, item_id
+    )
+    return JSONBytesResponse(
+        serialize(ItemRead, db_item), headers={"ETag": item_etag(db_item.version)}
+    )
 
 
 @router.put(
     "/update/{item_id}",
+    response_model=ItemEnvelope,
+    response_class=JSONBytesResponse,
     description="Update the details of an item by its ID. The user must be authenticated.",
     responses={
         200: {
@@ -103,6 +512,7 @@ def get_item_by_id(
                             "description": "An updated description for the hammer.",
                             "price": 15.0,
                             "category": "tools",
+                            "version": 1,
                         }
                     }
                 }
@@ -114,20 +524,36 @@ def get_item_by_id(
                 "application/json": {"example": {"detail": "Item with id=1 not found"}}
             },
         },
+        412: PRECONDITION_FAILED_RESPONSE,
     },
 )
-def update_item(
+async def update_item(
     item_id: int,
     item: ItemUpdate,
     current_user: Annotated[User, Depends(get_current_active_user)],
-    db: Session = Depends(get_db),
-) -> dict[str, Item]:
-    updated_item = update_item_service(db, item_id, item)
-    return {"updated": updated_item}
+    if_match: Optional[str] = Header(
+        default=None, description="Only update if the item's ETag is one of these"
+    ),
+    db: DBSession = Depends(get_write_db),
+) -> Response:
+    updated_item = await run_db(
+        db,
+        update_item_service,
+        update_item_service_async,
+        item_id,
+        item,
+        parse_if_match(if_match),
+    )
+    return JSONBytesResponse(
+        serialize(ItemEnvelope, {"updated": updated_item}),
+        headers={"ETag": item_etag(updated_item.version)},
+    )
 
 
 @router.delete(
     "/delete/{item_id}",
+    response_model=ItemEnvelope,
+    response_class=JSONBytesResponse,
     description="Delete an item by its ID. The user must be authenticated.",
     responses={
         200: {
@@ -141,6 +567,7 @@ def update_item(
                             "description": "A tool for hitting nails.",
                             "price": 10.0,
                             "category": "tools",
+                            "version": 1,
                         }
                     }
                 }
@@ -154,12 +581,22 @@ def update_item(
                 }
             },
         },
+        412: PRECONDITION_FAILED_RESPONSE,
     },
 )
-def delete_item(
+async def delete_item(
     item_id: int,
     current_user: Annotated[User, Depends(get_current_active_user)],
-    db: Session = Depends(get_db),
-) -> dict[str, Item]:
-    deleted_item = delete_item_service(db, item_id)
-    return {"deleted": deleted_item}
+    if_match: Optional[str] = Header(
+        default=None, description="Only delete if the item's ETag is one of these"
+    ),
+    db: DBSession = Depends(get_write_db),
+) -> Response:
+    deleted_item = await run_db(
+        db,
+        delete_item_service,
+        delete_item_service_async,
+        item_id,
+        parse_if_match(if_match),
+    )
+    return JSONBytesResponse(serialize(ItemEnvelope, {"deleted": deleted_item}))
@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from utils.metrics import CONTENT_TYPE, exposition
+
+router = APIRouter()
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint, aggregated across workers."""
+    return PlainTextResponse(await exposition(), media_type=CONTENT_TYPE)
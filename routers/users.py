@@ -1,8 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException
 from schemas.user import User, UserCreate
-from dependencies.db import get_db
-from services.user_service import create_user, get_user
-from sqlalchemy.orm import Session
+from dependencies.db import DBSession, get_write_db, run_db
+from services.auth_service import get_password_hash_async
+from services.user_service import (
+    create_user,
+    create_user_async,
+    get_user,
+    get_user_async,
+)
 import logging
 
 logger = logging.getLogger(__name__)
@@ -36,14 +41,25 @@ router = APIRouter()
                 }
             },
         },
+        503: {
+            "description": "Password hashing capacity exhausted; retry later.",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "detail": "Authentication service is busy, please retry"
+                    }
+                }
+            },
+        },
     },
 )
-def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: DBSession = Depends(get_write_db)):
     logger.info("Attempting to register user: %s", user.username)
-    db_user = get_user(db, user.username)
+    db_user = await run_db(db, get_user, get_user_async, user.username)
     if db_user:
         logger.error("Username already registered: %s", user.username)
         raise HTTPException(status_code=400, detail="Username already registered")
-    new_user = create_user(db, user)
+    hashed_password = await get_password_hash_async(user.password)
+    new_user = await run_db(db, create_user, create_user_async, user, hashed_password)
     logger.info("User registered successfully: %s", new_user.username)
     return new_user
@@ -1,7 +1,12 @@
-from pydantic import BaseModel, Field
-from typing import Optional
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from typing import Annotated, Optional
+from config import settings
 from models import Category
 
+# items.id is a 32-bit INTEGER column; larger ids cannot exist.
+ITEM_ID_MAX = 2**31 - 1
+ItemId = Annotated[int, Field(ge=-ITEM_ID_MAX - 1, le=ITEM_ID_MAX)]
+
 
 class Item(BaseModel):
     name: str = Field(description="Name of the item", min_length=1)
@@ -15,3 +20,68 @@ class ItemUpdate(BaseModel):
     description: Optional[str] = None
     price: Optional[float] = None
     category: Optional[Category] = None
+
+
+class ItemRead(Item):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    version: int = Field(description="Current row version, as used in ETag/If-Match")
+
+
+class ItemPage(BaseModel):
+    items: list[ItemRead]
+    next_cursor: Optional[int] = Field(
+        default=None, description="Pass as `cursor` to fetch the next page"
+    )
+
+
+class ItemBatchRequest(BaseModel):
+    ids: list[ItemId] = Field(
+        min_length=1,
+        max_length=settings.items_batch_max,
+        description="Item ids, in display order",
+    )
+
+    @field_validator("ids", mode="before")
+    @classmethod
+    def drop_repeats(cls, ids):
+        # As in GET /items/batch, repeated ids do not count towards the cap.
+        if isinstance(ids, list):
+            try:
+                return list(dict.fromkeys(ids))
+            except TypeError:
+                pass  # unhashable entries fail as non-integers below
+        return ids
+
+
+class ItemBatch(BaseModel):
+    items: list[ItemRead] = Field(description="Found items, in request order")
+    missing: list[int] = Field(description="Requested ids that do not exist")
+
+
+class ItemSearchResult(ItemRead):
+    rank: float = Field(description="Relevance score; higher is better")
+
+
+class ItemSearchPage(BaseModel):
+    items: list[ItemSearchResult]
+    next_offset: Optional[int] = Field(
+        default=None, description="Pass as `offset` to fetch the next page"
+    )
+
+
+class BulkImportError(BaseModel):
+    row: int = Field(
+        description="1-based data row; blank lines and the CSV header are not counted"
+    )
+    error: str
+
+
+class BulkImportReport(BaseModel):
+    inserted: int
+    failed: int
+    errors: list[BulkImportError]
+    errors_truncated: bool = Field(
+        description="True when more rows failed than are listed in `errors`"
+    )
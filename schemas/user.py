@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Optional
 
 
@@ -14,3 +14,11 @@ class UserCreate(BaseModel):
     email: Optional[str] = None
     full_name: Optional[str] = None
     password: str
+
+
+class Principal(User):
+    """The authenticated user handed to routes; never carries credentials."""
+
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
@@ -0,0 +1,120 @@
+"""Production entry point: gunicorn supervising uvicorn workers.
+
+    python server.py
+
+One worker per usable CPU when ``CACHE_URL`` points the caches and limits at
+a shared server, otherwise one worker, unless ``WEB_CONCURRENCY`` says
+otherwise. With
+``WEB_PRELOAD`` (the default) the app is imported once in the master and
+forked, so workers share its memory and boot quickly; ``post_fork`` then
+gives each worker its own database pools and logging thread. With more than
+one worker, workers log to stdout only rather than all rotating ``LOG_FILE``. On SIGTERM
+workers stop accepting connections and finish in-flight requests; whatever
+is still running after ``WEB_GRACEFUL_TIMEOUT`` seconds is killed.
+"""
+
+import glob
+import logging
+import os
+import tempfile
+from gunicorn.app.base import BaseApplication
+from uvicorn_worker import UvicornWorker
+from config import settings
+from utils.cpus import available_cpus
+
+logger = logging.getLogger(__name__)
+
+# Kept by each worker for itself unless CACHE_URL is set, so several workers
+# without it disagree on them.
+PER_PROCESS_STATE = (
+    "the item read cache",
+    "the principal cache",
+    "login throttle buckets",
+    "replica stickiness",
+)
+
+
+class Worker(UvicornWorker):
+    # uvicorn stops waiting for connections a little before the arbiter's
+    # SIGKILL, so the app's shutdown hooks (metrics, logs) still run.
+    CONFIG_KWARGS = {
+        **UvicornWorker.CONFIG_KWARGS,
+        "timeout_graceful_shutdown": max(settings.web_graceful_timeout - 5, 1),
+    }
+
+
+def on_starting(server):
+    # Migrate once here rather than racing in every worker's startup.
+    from database import init_db
+
+    init_db()
+    # Snapshots left by a previous run would be merged into /metrics.
+    if settings.metrics_dir:
+        for path in glob.glob(os.path.join(settings.metrics_dir, "*.json")):
+            os.remove(path)
+
+
+def post_fork(server, worker):
+    import database
+    from utils.logging import restart_after_fork
+
+    database.dispose_after_fork()
+    # Only a single worker may own LOG_FILE; more of them log to stdout.
+    restart_after_fork(log_to_file=server.cfg.workers == 1)
+
+
+class Server(BaseApplication):
+    def __init__(self, options: dict):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from main import app
+
+        return app
+
+
+def default_workers() -> int:
+    return available_cpus() if settings.cache_url else 1
+
+
+def options() -> dict:
+    return {
+        "bind": settings.web_bind,
+        "workers": settings.web_concurrency or default_workers(),
+        "worker_class": Worker,
+        "preload_app": settings.web_preload,
+        "graceful_timeout": settings.web_graceful_timeout,
+        # Requests are logged by the app's middleware.
+        "accesslog": None,
+        "on_starting": on_starting,
+        "post_fork": post_fork,
+    }
+
+
+def main():
+    config = options()
+    if config["workers"] > 1 and not settings.cache_url:
+        logger.warning(
+            "%d workers without CACHE_URL: each keeps its own %s",
+            config["workers"],
+            ", ".join(PER_PROCESS_STATE),
+        )
+    if config["workers"] > 1 and not settings.metrics_dir:
+        # /metrics has to see every worker. Workers import settings afresh
+        # unless preloaded, hence the environment variable.
+        settings.metrics_dir = tempfile.mkdtemp(prefix="toolshare-metrics-")
+        os.environ["METRICS_DIR"] = settings.metrics_dir
+    if not settings.hashing_workers:
+        # Each worker has its own bcrypt pool; together they get the CPUs once.
+        settings.hashing_workers = max(1, available_cpus() // config["workers"])
+        os.environ["HASHING_WORKERS"] = str(settings.hashing_workers)
+    Server(config).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,63 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from passlib.context import CryptContext
-from jose import JWTError, jwt
+from fastapi import HTTPException
 from datetime import datetime, timedelta, timezone
 from models import User as DBUser
+from schemas.user import Principal
 from config import settings
-from typing import Annotated, Optional
+from services.hashing import (
+    HashingPoolSaturated,
+    check_password,
+    hash_password,
+    hashing_pool,
+)
+from utils.cache import build_cache, export_stats
+from typing import Optional
 import logging
 
 logger = logging.getLogger(__name__)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 SECRET_KEY = settings.secret_key
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.access_token_expire_minutes
 
+# username -> Principal fields, so authenticated requests skip the users table
+principal_cache = build_cache(
+    "principal",
+    settings.principal_cache_size,
+    settings.principal_cache_ttl,
+    settings.cache_url,
+)
+export_stats("principal", principal_cache)
+
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return check_password(plain_password, hashed_password)
 
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return hash_password(password)
+
+
+async def _run_hashing(operation: str, fn, *args):
+    try:
+        return await hashing_pool.run(operation, fn, *args)
+    except HashingPoolSaturated:
+        logger.warning("Hashing pool saturated, rejecting %s", operation)
+        raise HTTPException(
+            status_code=503,
+            detail="Authentication service is busy, please retry",
+            headers={"Retry-After": "1"},
+        )
+
+
+async def verify_password_async(plain_password, hashed_password):
+    return await _run_hashing("verify", check_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password):
+    return await _run_hashing("hash", hash_password, password)
 
 
 def get_user(db: Session, username: str):
@@ -36,6 +73,21 @@ def authenticate_user(db: Session, username: str, password: str):
     return user
 
 
+async def get_user_async(db: AsyncSession, username: str):
+    return await db.scalar(select(DBUser).where(DBUser.username == username))
+
+
+def token_claims(user: DBUser) -> dict:
+    """Claims for ``user``'s access token, enough to skip the users table."""
+    principal = Principal.model_validate(user)
+    return {
+        "sub": principal.username,
+        "uid": principal.id,
+        "disabled": bool(principal.disabled),
+        "ver": user.token_version,
+    }
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -43,5 +95,8 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.now(timezone.utc) + timedelta(minutes=15)
     to_encode.update({"exp": expire})
+    # Imported here to keep python-jose out of process startup.
+    from jose import jwt
+
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
@@ -0,0 +1,135 @@
+"""Off-loop bcrypt execution.
+
+bcrypt costs hundreds of milliseconds of CPU per call, so hashing and
+verification run in a process pool sized to the CPUs the process may use instead of
+on the event loop or in the threadpool that sync routes share. Admission is
+bounded: once ``max_pending`` jobs are queued or running, new callers fail
+fast with ``HashingPoolSaturated`` rather than queueing behind a burst.
+
+passlib and the process pool machinery are imported on first use: the
+serving process only needs them once someone logs in or registers.
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from functools import lru_cache
+from config import settings
+from utils.cpus import available_cpus
+from utils.metrics import registry
+
+PASSWORD_HASH_DURATION = registry.histogram(
+    "toolshare_password_hash_duration_seconds",
+    "bcrypt hash/verify time through the hashing pool, queueing included.",
+    ("operation",),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+HASHING_QUEUE_DEPTH = registry.gauge(
+    "toolshare_password_hash_pending",
+    "Password operations queued or running in the hashing pool.",
+)
+
+
+@lru_cache(maxsize=None)
+def password_context():
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def hash_password(password: str) -> str:
+    return password_context().hash(password)
+
+
+def check_password(plain_password: str, hashed_password: str) -> bool:
+    return password_context().verify(plain_password, hashed_password)
+
+
+class HashingPoolSaturated(Exception):
+    """Raised when the hashing pool already has ``max_pending`` jobs."""
+
+
+class HashingPool:
+    """Bounded process pool for password hashing.
+
+    ``run`` must be awaited from the event loop; the pending counter is only
+    touched there, so it needs no lock.
+    """
+
+    def __init__(self, workers: int, max_pending: int, window: int = 1024):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+        self._executor = None
+        self._pid = None
+        self._latencies = {}
+        self._counts = {}
+        self._window = window
+
+    def _get_executor(self):
+        # A pool inherited through fork() belongs to the parent; start our own.
+        if self._executor is None or self._pid != os.getpid():
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            self._pid = os.getpid()
+        return self._executor
+
+    async def run(self, operation: str, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HashingPoolSaturated(
+                f"{self.pending} password operations already pending"
+            )
+        self.pending += 1
+        start = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.pending -= 1
+            self._record(operation, time.perf_counter() - start)
+
+    def _record(self, operation: str, seconds: float):
+        if operation not in self._latencies:
+            self._latencies[operation] = deque(maxlen=self._window)
+            self._counts[operation] = 0
+        self._latencies[operation].append(seconds)
+        self._counts[operation] += 1
+        PASSWORD_HASH_DURATION.observe(seconds, operation=operation)
+
+    def stats(self) -> dict:
+        operations = {}
+        for operation, window in self._latencies.items():
+            recent = sorted(window)
+            operations[operation] = {
+                "count": self._counts[operation],
+                "p50_seconds": recent[len(recent) // 2],
+                "p95_seconds": recent[min(len(recent) - 1, int(len(recent) * 0.95))],
+                "max_seconds": recent[-1],
+            }
+        return {
+            "workers": self.workers,
+            "queue_depth": self.pending,
+            "max_pending": self.max_pending,
+            "rejected": self.rejected,
+            "operations": operations,
+        }
+
+    def shutdown(self):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+
+
+hashing_pool = HashingPool(
+    workers=settings.hashing_workers or available_cpus(),
+    max_pending=settings.hashing_max_pending,
+)
+registry.add_collector(lambda: HASHING_QUEUE_DEPTH.set(hashing_pool.pending))
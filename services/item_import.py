@@ -0,0 +1,292 @@
+"""Streaming bulk import of items from NDJSON or CSV request bodies.
+
+The body is consumed chunk by chunk and validated row by row, and valid
+rows are inserted in fixed-size batches, each in its own transaction. Only
+the current line, one batch, and at most ``max_errors`` error entries are
+held in memory, however large the upload.
+"""
+
+import codecs
+import csv
+import io
+import json
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Optional
+from pydantic import ValidationError
+from sqlalchemy import column, insert, select, table, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from models import Item as DBItem
+from schemas.item import Item
+from services.item_service import is_postgres, search_vector_expr
+from services.search_index import search_index
+
+NDJSON_TYPES = {"application/x-ndjson", "application/jsonl", "application/json-seq"}
+CSV_TYPES = {"text/csv", "application/csv"}
+
+COPY_COLUMNS = ("name", "description", "price", "category")
+# On Postgres a batch is COPYed into this per-connection staging table and
+# moved into items by one INSERT ... SELECT that also computes search_vector,
+# so every row is written to items exactly once.
+STAGING_TABLE = "item_import_staging"
+CREATE_STAGING_SQL = text(
+    f"CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} ON COMMIT DELETE ROWS AS "
+    f"SELECT {', '.join(COPY_COLUMNS)} FROM items WITH NO DATA"
+)
+COPY_SQL = (
+    f"COPY {STAGING_TABLE} ({', '.join(COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+)
+
+
+class BadLine(Exception):
+    """Marks a physical line that was dropped; ``error`` is its row error."""
+
+    error = "unreadable line"
+
+
+class LineTooLong(BadLine):
+    """Marks a physical line that exceeded the configured size limit."""
+
+    error = "line too long"
+
+
+class NotUTF8(BadLine):
+    """Marks a physical line that is not valid UTF-8."""
+
+    error = "invalid UTF-8"
+
+
+def _decode(line: bytes):
+    try:
+        return line.decode("utf-8")
+    except UnicodeDecodeError:
+        return NotUTF8()
+
+
+async def iter_lines(
+    chunks: AsyncIterator[bytes], max_line_bytes: int
+) -> AsyncIterator[str]:
+    """Yield decoded lines from a byte stream.
+
+    A line longer than ``max_line_bytes`` (encoded, without the newline) or
+    not valid UTF-8 is discarded and reported by yielding a ``BadLine`` in
+    its place, so the rest of the body is still imported. Lines are split
+    before decoding: a newline byte never occurs inside a multi-byte UTF-8
+    sequence. A leading byte order mark is dropped.
+    """
+    buffer = b""
+    skipping = False
+    first = True
+    async for chunk in chunks:
+        buffer += chunk
+        if first:
+            if len(buffer) < len(codecs.BOM_UTF8) and b"\n" not in buffer:
+                continue
+            buffer = buffer.removeprefix(codecs.BOM_UTF8)
+            first = False
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if skipping:
+                skipping = False
+            elif len(line) > max_line_bytes:
+                yield LineTooLong()
+            else:
+                yield _decode(line)
+        if len(buffer) > max_line_bytes:
+            if not skipping:
+                yield LineTooLong()
+            buffer = b""
+            skipping = True
+    if first:
+        buffer = buffer.removeprefix(codecs.BOM_UTF8)
+    if buffer and not skipping:
+        yield _decode(buffer)
+
+
+async def parse_ndjson(lines: AsyncIterator[str]):
+    """Yield ``(row, data, error)`` for each non-blank NDJSON line.
+
+    Rows are numbered like CSV data rows: blank lines are not counted.
+    """
+    row = 0
+    async for line in lines:
+        if isinstance(line, BadLine):
+            row += 1
+            yield row, None, line.error
+            continue
+        if not line.strip():
+            continue
+        row += 1
+        try:
+            data = json.loads(line)
+        except ValueError as exc:
+            yield row, None, f"invalid JSON: {exc}"
+            continue
+        if not isinstance(data, dict):
+            yield row, None, "expected a JSON object"
+            continue
+        yield row, data, None
+
+
+async def parse_csv(lines: AsyncIterator[str], max_record_bytes: int):
+    """Yield ``(row, data, error)`` for each CSV record after the header.
+
+    Quoted fields may span lines: physical lines are joined until the
+    record's quotes balance. A record still open after ``max_record_bytes``
+    (or at the end of the body) is taken to start with a stray quote: its
+    first line is rejected and the lines after it are parsed again, so one
+    bad row cannot swallow the rest of the upload.
+    """
+    header: Optional[list[str]] = None
+    pending: list[str] = []
+    pending_bytes = 0
+    quotes = 0
+    row = 0
+    replay: deque = deque()
+
+    def resync():
+        # Everything after the opening line goes back through the parser.
+        nonlocal pending, pending_bytes, quotes
+        replay.extendleft(reversed(pending[1:]))
+        pending, pending_bytes, quotes = [], 0, 0
+
+    async def physical_lines():
+        async for line in lines:
+            replay.append(line)
+            while replay:
+                yield replay.popleft()
+        while pending:
+            yield None
+            while replay:
+                yield replay.popleft()
+
+    async for line in physical_lines():
+        if line is None:
+            row += 1
+            yield row, None, "unterminated quoted field"
+            resync()
+            continue
+        if isinstance(line, BadLine):
+            row += 1
+            pending, pending_bytes, quotes = [], 0, 0
+            yield row, None, line.error
+            continue
+        pending.append(line)
+        pending_bytes += len(line.encode()) + 1
+        quotes += line.count('"')
+        if quotes % 2:
+            if pending_bytes > max_record_bytes:
+                row += 1
+                yield row, None, "unterminated quoted field"
+                resync()
+            continue
+        text = "\n".join(pending).rstrip("\r")
+        pending, pending_bytes, quotes = [], 0, 0
+        if not text.strip():
+            continue
+        values = next(csv.reader([text]))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        row += 1
+        if len(values) != len(header):
+            yield row, None, f"expected {len(header)} fields, got {len(values)}"
+            continue
+        # Empty cells mean "not provided" so schema defaults apply.
+        yield row, {k: v for k, v in zip(header, values) if v != ""}, None
+
+
+def _format_errors(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+        for error in exc.errors()
+    )
+
+
+async def import_items(
+    records,
+    insert_batch: Callable[[list[Item]], Awaitable[int]],
+    batch_size: int,
+    max_errors: int,
+) -> dict:
+    """Validate ``records`` and hand valid rows to ``insert_batch`` in batches."""
+    report = {"inserted": 0, "failed": 0, "errors": [], "errors_truncated": False}
+    batch: list[Item] = []
+    async for row, data, error in records:
+        if error is None:
+            try:
+                batch.append(Item.model_validate(data))
+            except ValidationError as exc:
+                error = _format_errors(exc)
+        if error is not None:
+            report["failed"] += 1
+            if len(report["errors"]) < max_errors:
+                report["errors"].append({"row": row, "error": error})
+            else:
+                report["errors_truncated"] = True
+        if len(batch) >= batch_size:
+            report["inserted"] += await insert_batch(batch)
+            batch = []
+    if batch:
+        report["inserted"] += await insert_batch(batch)
+    return report
+
+
+def _copy_value(value) -> str:
+    # COPY csv: unquoted empty is NULL, a quoted empty string is ''.
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return repr(value)
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def _copy_records(items: list[Item]):
+    # SqlEnum stores enum names, so COPY must too.
+    return [
+        (item.name, item.description, item.price, item.category.name) for item in items
+    ]
+
+
+_staging = table(STAGING_TABLE, *(column(name) for name in COPY_COLUMNS))
+_FROM_STAGING = insert(DBItem).from_select(
+    [*COPY_COLUMNS, "search_vector"],
+    select(
+        *_staging.c,
+        search_vector_expr(_staging.c.name, _staging.c.description),
+    ),
+)
+
+
+def insert_items_batch(db: Session, items: list[Item]) -> int:
+    if is_postgres(db):
+        db.execute(CREATE_STAGING_SQL)
+        buffer = io.StringIO()
+        for record in _copy_records(items):
+            buffer.write(",".join(_copy_value(value) for value in record) + "\n")
+        buffer.seek(0)
+        dbapi_connection = db.connection().connection.dbapi_connection
+        with dbapi_connection.cursor() as cursor:
+            cursor.copy_expert(COPY_SQL, buffer)
+        db.execute(_FROM_STAGING)
+    else:
+        db.execute(insert(DBItem), [item.model_dump() for item in items])
+        search_index.reset()
+    db.commit()
+    return len(items)
+
+
+async def insert_items_batch_async(db: AsyncSession, items: list[Item]) -> int:
+    if is_postgres(db):
+        await db.execute(CREATE_STAGING_SQL)
+        connection = await db.connection()
+        raw = await connection.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            STAGING_TABLE, records=_copy_records(items), columns=COPY_COLUMNS
+        )
+        await db.execute(_FROM_STAGING)
+    else:
+        await db.execute(insert(DBItem), [item.model_dump() for item in items])
+        search_index.reset()
+    await db.commit()
+    return len(items)
@@ -1,42 +1,394 @@
+from typing import Optional
+from sqlalchemy import delete, func, literal_column, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from models import Item as DBItem
-from schemas.item import Item, ItemUpdate
+from models import Category, Item as DBItem
+from config import settings
+from schemas.item import Item, ItemRead, ItemUpdate
+from services.search_index import search_index
+from utils.cache import ReadThrough, build_cache, export_stats
 from fastapi import HTTPException
 
+SEARCH_CONFIG = "english"
+
+# item id -> ItemRead fields, invalidated by update and delete
+item_reads = ReadThrough(
+    build_cache(
+        "item", settings.item_cache_size, settings.item_cache_ttl, settings.cache_url
+    ),
+    hold=settings.item_cache_refill_hold,
+)
+export_stats("item", item_reads)
+
+
+def _snapshot(db_item: Optional[DBItem]) -> Optional[dict]:
+    if db_item is None:
+        return None
+    return ItemRead.model_validate(db_item).model_dump(mode="json")
+
+
+def _select_item(item_id: int):
+    return select(DBItem).where(DBItem.id == item_id)
+
+
+def _select_items(item_ids: list[int]):
+    return select(DBItem).where(DBItem.id.in_(item_ids))
+
+
+def _in_request_order(item_ids: list[int], rows):
+    found = {item.id: item for item in rows}
+    return {
+        "items": [found[i] for i in item_ids if i in found],
+        "missing": [i for i in item_ids if i not in found],
+    }
+
+
+def is_replica(db) -> bool:
+    """Whether ``db`` reads from a replica (set by get_read_db)."""
+    return db.info.get("replica", False)
+
+
+def is_postgres(db) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def search_vector_expr(name, description):
+    """tsvector for an item; name lexemes rank above description (A over B).
+
+    Accepts plain values or column expressions. The weights are inlined:
+    setweight takes a "char", which a VARCHAR-cast bind (asyncpg) won't match.
+    """
+    name_vector = func.setweight(
+        func.to_tsvector(SEARCH_CONFIG, func.coalesce(name, "")),
+        literal_column("'A'"),
+    )
+    description_vector = func.setweight(
+        func.to_tsvector(SEARCH_CONFIG, func.coalesce(description, "")),
+        literal_column("'B'"),
+    )
+    return name_vector.op("||")(description_vector)
+
+
+def _set_search_vector(db, db_item: DBItem):
+    if is_postgres(db):
+        db_item.search_vector = search_vector_expr(db_item.name, db_item.description)
+
+
+def _reindex(db, db_item: DBItem):
+    # Only maintain the fallback index once a search has built it.
+    if not is_postgres(db) and search_index.loaded:
+        search_index.add(db_item.id, db_item.name, db_item.description)
+
+
+def _search_query(q: str, offset: int, limit: int):
+    tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+    rank = func.ts_rank_cd(DBItem.search_vector, tsquery).label("rank")
+    return (
+        select(DBItem, rank)
+        .where(DBItem.search_vector.op("@@")(tsquery))
+        .order_by(rank.desc(), DBItem.id)
+        .offset(offset)
+        .limit(limit + 1)
+    )
+
+
+_INDEXED_COLUMNS = select(DBItem.id, DBItem.name, DBItem.description)
+
+
+def _search_page(hits, offset: int, limit: int):
+    items = [
+        {
+            "id": item.id,
+            "name": item.name,
+            "description": item.description,
+            "price": item.price,
+            "category": item.category,
+            "version": item.version,
+            "rank": rank,
+        }
+        for item, rank in hits[:limit]
+    ]
+    next_offset = offset + limit if len(hits) > limit else None
+    return {"items": items, "next_offset": next_offset}
+
+
+def _update_statement(
+    db, item_id: int, update_data: dict, expected_versions: Optional[list[int]]
+):
+    values = {**update_data, "version": DBItem.version + 1}
+    if is_postgres(db):
+        # SET expressions see the old row, so feed in the new values.
+        values["search_vector"] = search_vector_expr(
+            update_data["name"] if "name" in update_data else DBItem.name,
+            (
+                update_data["description"]
+                if "description" in update_data
+                else DBItem.description
+            ),
+        )
+    statement = update(DBItem).where(DBItem.id == item_id)
+    if expected_versions is not None:
+        statement = statement.where(DBItem.version.in_(expected_versions))
+    # populate_existing: refresh an instance this session already holds
+    return (
+        statement.values(**values)
+        .returning(DBItem)
+        .execution_options(synchronize_session=False, populate_existing=True)
+    )
+
+
+def _delete_statement(item_id: int, expected_versions: Optional[list[int]]):
+    statement = delete(DBItem).where(DBItem.id == item_id)
+    if expected_versions is not None:
+        statement = statement.where(DBItem.version.in_(expected_versions))
+    return statement.returning(DBItem).execution_options(synchronize_session=False)
+
+
+def _item_exists(item_id: int):
+    return select(DBItem.id).where(DBItem.id == item_id)
+
+
+def _write_failed(exists: bool, item_id: int, missing_detail: str):
+    # Only reached when the conditional write matched no row.
+    if exists:
+        raise HTTPException(
+            status_code=412, detail=f"Item with id={item_id} has been modified"
+        )
+    raise HTTPException(status_code=404, detail=missing_detail)
+
 
 def add_item_service(db: Session, item: Item):
-    new_item = DBItem(**item.dict())
+    new_item = DBItem(**item.model_dump())
+    _set_search_vector(db, new_item)
     db.add(new_item)
     db.commit()
     db.refresh(new_item)
+    _reindex(db, new_item)
     return new_item
 
 
+def _item_page_query(
+    cursor: Optional[int],
+    limit: int,
+    category: Optional[Category],
+    min_price: Optional[float],
+    max_price: Optional[float],
+):
+    # Keyset pagination: seek past the last id instead of OFFSET, and fetch
+    # one extra row to learn whether another page exists. A price range
+    # has no index in id order, so its pages cost more the more items fall in
+    # the range; see models.Item.
+    query = select(DBItem).order_by(DBItem.id).limit(limit + 1)
+    if cursor is not None:
+        query = query.where(DBItem.id > cursor)
+    if category is not None:
+        query = query.where(DBItem.category == category)
+    if min_price is not None:
+        query = query.where(DBItem.price >= min_price)
+    if max_price is not None:
+        query = query.where(DBItem.price <= max_price)
+    return query
+
+
+def _item_page(rows, limit: int):
+    items = rows[:limit]
+    next_cursor = items[-1].id if len(rows) > limit else None
+    return {"items": items, "next_cursor": next_cursor}
+
+
+def list_items_service(
+    db: Session,
+    cursor: Optional[int],
+    limit: int,
+    category: Optional[Category] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+):
+    query = _item_page_query(cursor, limit, category, min_price, max_price)
+    return _item_page(db.scalars(query).all(), limit)
+
+
+def search_items_service(db: Session, q: str, offset: int, limit: int):
+    if is_postgres(db):
+        hits = db.execute(_search_query(q, offset, limit)).all()
+        return _search_page(hits, offset, limit)
+    if not search_index.loaded:
+        search_index.load(db.execute(_INDEXED_COLUMNS))
+    ranked = search_index.search(q, offset, limit + 1)
+    rows = db.scalars(select(DBItem).where(DBItem.id.in_([i for i, _ in ranked])))
+    items = {item.id: item for item in rows}
+    hits = [(items[i], rank) for i, rank in ranked if i in items]
+    return _search_page(hits, offset, limit)
+
+
 def get_item_by_id_service(db: Session, item_id: int):
-    db_item = db.query(DBItem).filter(DBItem.id == item_id).first()
-    if not db_item:
+    # Only the primary fills the cache: a lagging replica could put back a
+    # row that a write has just invalidated.
+    snapshot = item_reads.get(
+        item_id,
+        lambda: _snapshot(db.scalar(_select_item(item_id))),
+        store=not is_replica(db),
+    )
+    if snapshot is None:
         raise HTTPException(status_code=404, detail=f"Item with id={item_id} not found")
-    return db_item
+    return ItemRead.model_validate(snapshot)
+
+
+def get_items_by_ids_service(db: Session, item_ids: list[int]):
+    """Items for ``item_ids`` in one query, in that order, plus the missing ids.
+
+    Goes to the database rather than the per-item read cache: with a shared
+    cache that would be a round trip per id instead of one for the batch.
+    """
+    return _in_request_order(item_ids, db.scalars(_select_items(item_ids)).all())
 
 
-def update_item_service(db: Session, item_id: int, item: ItemUpdate):
-    db_item = db.query(DBItem).filter(DBItem.id == item_id).first()
-    if not db_item:
+def get_item_version_service(db: Session, item_id: int) -> int:
+    """Current version of an item, from the read cache or a one-column probe."""
+    snapshot = item_reads.peek(item_id)
+    if snapshot is not None:
+        return snapshot["version"]
+    version = db.scalar(select(DBItem.version).where(DBItem.id == item_id))
+    if version is None:
         raise HTTPException(status_code=404, detail=f"Item with id={item_id} not found")
-    update_data = item.dict(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(db_item, key, value)
+    return version
+
+
+def update_item_service(
+    db: Session,
+    item_id: int,
+    item: ItemUpdate,
+    expected_versions: Optional[list[int]] = None,
+):
+    """Apply ``item`` in a single UPDATE ... RETURNING.
+
+    With ``expected_versions`` (from If-Match) the row is only updated while
+    its version is one of them; otherwise the caller gets a 412.
+    """
+    update_data = item.model_dump(exclude_unset=True)
+    statement = _update_statement(db, item_id, update_data, expected_versions)
+    db_item = db.scalars(statement).first()
+    if db_item is None:
+        db.rollback()
+        exists = expected_versions is not None and db.scalar(_item_exists(item_id))
+        _write_failed(exists, item_id, f"Item with id={item_id} not found")
+    # Detach so commit does not expire it and force a reload.
+    db.expunge(db_item)
     db.commit()
-    db.refresh(db_item)
+    item_reads.invalidate(item_id)
+    _reindex(db, db_item)
     return db_item
 
 
-def delete_item_service(db: Session, item_id: int):
-    db_item = db.query(DBItem).filter(DBItem.id == item_id).first()
-    if not db_item:
-        raise HTTPException(
-            status_code=404, detail=f"Item with id={item_id} does not exist"
-        )
-    db.delete(db_item)
+def delete_item_service(
+    db: Session, item_id: int, expected_versions: Optional[list[int]] = None
+):
+    db_item = db.scalars(_delete_statement(item_id, expected_versions)).first()
+    if db_item is None:
+        db.rollback()
+        exists = expected_versions is not None and db.scalar(_item_exists(item_id))
+        _write_failed(exists, item_id, f"Item with id={item_id} does not exist")
+    db.expunge(db_item)
     db.commit()
+    item_reads.invalidate(item_id)
+    search_index.remove(item_id)
+    return db_item
+
+
+async def add_item_service_async(db: AsyncSession, item: Item):
+    new_item = DBItem(**item.model_dump())
+    _set_search_vector(db, new_item)
+    db.add(new_item)
+    await db.commit()
+    await db.refresh(new_item)
+    _reindex(db, new_item)
+    return new_item
+
+
+async def list_items_service_async(
+    db: AsyncSession,
+    cursor: Optional[int],
+    limit: int,
+    category: Optional[Category] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+):
+    query = _item_page_query(cursor, limit, category, min_price, max_price)
+    return _item_page((await db.scalars(query)).all(), limit)
+
+
+async def search_items_service_async(db: AsyncSession, q: str, offset: int, limit: int):
+    if is_postgres(db):
+        hits = (await db.execute(_search_query(q, offset, limit))).all()
+        return _search_page(hits, offset, limit)
+    if not search_index.loaded:
+        search_index.load((await db.execute(_INDEXED_COLUMNS)).all())
+    ranked = search_index.search(q, offset, limit + 1)
+    rows = await db.scalars(select(DBItem).where(DBItem.id.in_([i for i, _ in ranked])))
+    items = {item.id: item for item in rows}
+    hits = [(items[i], rank) for i, rank in ranked if i in items]
+    return _search_page(hits, offset, limit)
+
+
+async def get_item_by_id_service_async(db: AsyncSession, item_id: int):
+    async def load():
+        return _snapshot(await db.scalar(_select_item(item_id)))
+
+    snapshot = await item_reads.aget(item_id, load, store=not is_replica(db))
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail=f"Item with id={item_id} not found")
+    return ItemRead.model_validate(snapshot)
+
+
+async def get_items_by_ids_service_async(db: AsyncSession, item_ids: list[int]):
+    rows = (await db.scalars(_select_items(item_ids))).all()
+    return _in_request_order(item_ids, rows)
+
+
+async def get_item_version_service_async(db: AsyncSession, item_id: int) -> int:
+    snapshot = await item_reads.apeek(item_id)
+    if snapshot is not None:
+        return snapshot["version"]
+    version = await db.scalar(select(DBItem.version).where(DBItem.id == item_id))
+    if version is None:
+        raise HTTPException(status_code=404, detail=f"Item with id={item_id} not found")
+    return version
+
+
+async def update_item_service_async(
+    db: AsyncSession,
+    item_id: int,
+    item: ItemUpdate,
+    expected_versions: Optional[list[int]] = None,
+):
+    update_data = item.model_dump(exclude_unset=True)
+    statement = _update_statement(db, item_id, update_data, expected_versions)
+    db_item = (await db.scalars(statement)).first()
+    if db_item is None:
+        await db.rollback()
+        exists = expected_versions is not None and await db.scalar(
+            _item_exists(item_id)
+        )
+        _write_failed(exists, item_id, f"Item with id={item_id} not found")
+    db.expunge(db_item)
+    await db.commit()
+    await item_reads.ainvalidate(item_id)
+    _reindex(db, db_item)
+    return db_item
+
+
+async def delete_item_service_async(
+    db: AsyncSession, item_id: int, expected_versions: Optional[list[int]] = None
+):
+    db_item = (await db.scalars(_delete_statement(item_id, expected_versions))).first()
+    if db_item is None:
+        await db.rollback()
+        exists = expected_versions is not None and await db.scalar(
+            _item_exists(item_id)
+        )
+        _write_failed(exists, item_id, f"Item with id={item_id} does not exist")
+    db.expunge(db_item)
+    await db.commit()
+    await item_reads.ainvalidate(item_id)
+    search_index.remove(item_id)
     return db_item
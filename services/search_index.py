@@ -0,0 +1,97 @@
+"""In-process inverted index used for item search when not on Postgres.
+
+Postgres answers ``GET /items/search`` from the ``search_vector`` tsvector
+column and its GIN index. Other backends (SQLite in tests and local
+development) fall back to this index, which mirrors the Postgres behaviour
+closely enough to exercise the feature: every query term must match, name
+matches weigh more than description matches, and rarer terms weigh more
+than common ones. The index is per process and is built from the table on
+first use, then kept current by the item service.
+"""
+
+import math
+import re
+import threading
+from collections import Counter
+from typing import Iterable, Optional
+
+NAME_WEIGHT = 2.0
+DESCRIPTION_WEIGHT = 1.0
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: Optional[str]) -> list[str]:
+    return _TOKEN.findall(text.lower()) if text else []
+
+
+class InvertedIndex:
+    def __init__(self):
+        self.loaded = False
+        self._postings: dict[str, dict[int, float]] = {}
+        self._terms: dict[int, set[str]] = {}
+        self._lock = threading.Lock()
+
+    def load(self, rows: Iterable[tuple[int, str, Optional[str]]]):
+        """(Re)build the index from ``(id, name, description)`` rows."""
+        with self._lock:
+            self._postings.clear()
+            self._terms.clear()
+            for item_id, name, description in rows:
+                self._add(item_id, name, description)
+            self.loaded = True
+
+    def reset(self):
+        """Drop everything; the next search rebuilds from the table."""
+        with self._lock:
+            self._postings.clear()
+            self._terms.clear()
+            self.loaded = False
+
+    def add(self, item_id: int, name: str, description: Optional[str]):
+        with self._lock:
+            self._remove(item_id)
+            self._add(item_id, name, description)
+
+    def remove(self, item_id: int):
+        with self._lock:
+            self._remove(item_id)
+
+    def search(self, query: str, offset: int, limit: int) -> list[tuple[int, float]]:
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        with self._lock:
+            postings = [self._postings.get(term, {}) for term in terms]
+            if not all(postings):
+                return []
+            total = len(self._terms)
+            idf = [math.log(1 + total / len(docs)) for docs in postings]
+            matched = set(min(postings, key=len)).intersection(*postings)
+            scores = {
+                doc: sum(docs[doc] * weight for docs, weight in zip(postings, idf))
+                for doc in matched
+            }
+        ranked = sorted(scores.items(), key=lambda hit: (-hit[1], hit[0]))
+        end = offset + limit
+        return ranked[offset:end]
+
+    def _add(self, item_id: int, name: str, description: Optional[str]):
+        weights: Counter = Counter()
+        for term in tokenize(name):
+            weights[term] += NAME_WEIGHT
+        for term in tokenize(description):
+            weights[term] += DESCRIPTION_WEIGHT
+        for term, weight in weights.items():
+            self._postings.setdefault(term, {})[item_id] = weight
+        self._terms[item_id] = set(weights)
+
+    def _remove(self, item_id: int):
+        for term in self._terms.pop(item_id, ()):
+            docs = self._postings[term]
+            docs.pop(item_id, None)
+            if not docs:
+                del self._postings[term]
+
+
+search_index = InvertedIndex()
@@ -0,0 +1,219 @@
+"""Access-token revocation without a database read per request.
+
+Revoking a user's tokens (logout, and whatever disables an account or
+changes a password) bumps ``users.token_version`` and appends a row to
+``token_revocations``. Tokens carry the version they were issued with, so a
+token is revoked when its version is below the latest revoked one for its
+user. ``revocations`` keeps exactly that: one entry per user revoked within
+a token lifetime, since older revocations only cover expired tokens.
+
+Each worker applies its own revocations at once and picks up the others'
+by re-reading ``token_revocations`` every
+``settings.token_revocation_refresh_seconds``; that interval is how long a
+revoked token may still be accepted by another worker. Row ids can commit
+out of order, so each read goes back ``token_revocation_overlap_seconds``
+before the newest revocation already seen and skips rows it already has.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Callable, Optional
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from config import settings
+from models import TokenRevocation, User as DBUser
+from services.auth_service import principal_cache
+from utils.cache import cache_delete
+
+logger = logging.getLogger(__name__)
+
+
+def token_lifetime() -> float:
+    """Longest lifetime of a token create_access_token issues, in seconds."""
+    return max(settings.access_token_expire_minutes, 15) * 60
+
+
+class RevocationFilter:
+    def __init__(
+        self,
+        retention: float,
+        overlap: float,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.retention = retention
+        self.overlap = overlap
+        # Newest revoked_at applied so far
+        self.since: Optional[float] = None
+        self._clock = clock
+        # user id -> (lowest valid token version, when it was revoked)
+        self._versions: dict[int, tuple[int, float]] = {}
+        # row id -> revoked_at, for rows the next read will see again
+        self._seen: dict[int, float] = {}
+
+    def revoke(self, user_id: int, version: int, revoked_at: float):
+        current = self._versions.get(user_id)
+        if current is None or version > current[0]:
+            self._versions[user_id] = (version, revoked_at)
+
+    def is_revoked(self, user_id: int, version: int) -> bool:
+        current = self._versions.get(user_id)
+        return current is not None and version < current[0]
+
+    def window_start(self) -> float:
+        """Oldest revoked_at the next read has to cover."""
+        start = self._clock() - self.retention
+        if self.since is not None:
+            start = max(start, self.since - self.overlap)
+        return start
+
+    def apply(self, rows):
+        """Add ``token_revocations`` rows (id, user_id, token_version, revoked_at)."""
+        for row_id, user_id, version, revoked_at in rows:
+            if row_id in self._seen:
+                continue
+            revoked_at = revoked_at.timestamp()
+            self._seen[row_id] = revoked_at
+            self.revoke(user_id, version, revoked_at)
+            if self.since is None or revoked_at > self.since:
+                self.since = revoked_at
+        start = self.window_start()
+        for row_id, revoked_at in list(self._seen.items()):
+            if revoked_at < start:
+                del self._seen[row_id]
+        cutoff = self._clock() - self.retention
+        for user_id, (_, revoked_at) in list(self._versions.items()):
+            if revoked_at < cutoff:
+                del self._versions[user_id]
+
+    def clear(self):
+        self._versions.clear()
+        self._seen.clear()
+        self.since = None
+
+    def __len__(self):
+        return len(self._versions)
+
+
+revocations = RevocationFilter(
+    token_lifetime(), settings.token_revocation_overlap_seconds
+)
+
+
+def _new_revocations():
+    start = datetime.fromtimestamp(revocations.window_start(), timezone.utc)
+    return (
+        select(
+            TokenRevocation.id,
+            TokenRevocation.user_id,
+            TokenRevocation.token_version,
+            TokenRevocation.revoked_at,
+        )
+        .where(TokenRevocation.revoked_at >= start)
+        .order_by(TokenRevocation.revoked_at)
+    )
+
+
+def _as_utc(rows):
+    # SQLite hands timestamps back without a zone; they were written as UTC.
+    return [
+        (row_id, user_id, version, at if at.tzinfo else at.replace(tzinfo=timezone.utc))
+        for row_id, user_id, version, at in rows
+    ]
+
+
+def refresh_revocations(db: Session):
+    revocations.apply(_as_utc(db.execute(_new_revocations())))
+
+
+async def refresh_revocations_async(db: AsyncSession):
+    rows = await db.execute(_new_revocations())
+    revocations.apply(_as_utc(rows))
+
+
+def _bump_version(user_id: int):
+    return (
+        update(DBUser)
+        .where(DBUser.id == user_id)
+        .values(token_version=DBUser.token_version + 1)
+        .returning(DBUser.username, DBUser.token_version)
+    )
+
+
+def _revocation(user_id: int, version: int) -> TokenRevocation:
+    return TokenRevocation(
+        user_id=user_id, token_version=version, revoked_at=datetime.now(timezone.utc)
+    )
+
+
+def revoke_tokens(db: Session, user_id: int) -> Optional[int]:
+    """Revoke every token issued to ``user_id``; returns the new version."""
+    row = db.execute(_bump_version(user_id)).first()
+    if row is None:
+        db.rollback()
+        return None
+    db.add(_revocation(user_id, row.token_version))
+    db.commit()
+    revocations.revoke(user_id, row.token_version, time.time())
+    principal_cache.delete(row.username)
+    return row.token_version
+
+
+async def revoke_tokens_async(db: AsyncSession, user_id: int) -> Optional[int]:
+    row = (await db.execute(_bump_version(user_id))).first()
+    if row is None:
+        await db.rollback()
+        return None
+    db.add(_revocation(user_id, row.token_version))
+    await db.commit()
+    revocations.revoke(user_id, row.token_version, time.time())
+    await cache_delete(principal_cache, row.username)
+    return row.token_version
+
+
+async def load_revocations():
+    """Catch up with ``token_revocations`` using a session of our own."""
+    import database
+
+    if settings.database_async:
+        async with database.AsyncSessionLocal() as db:
+            await refresh_revocations_async(db)
+    else:
+
+        def refresh():
+            with database.SessionLocal() as db:
+                refresh_revocations(db)
+
+        await run_in_threadpool(refresh)
+
+
+_refresher: Optional[asyncio.Task] = None
+
+
+async def _refresh_periodically(interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await load_revocations()
+        except Exception:
+            logger.exception("Could not refresh token revocations")
+
+
+async def start_refresher():
+    """Load recent revocations, then keep following new ones."""
+    global _refresher
+    await load_revocations()
+    if _refresher is None:
+        _refresher = asyncio.create_task(
+            _refresh_periodically(settings.token_revocation_refresh_seconds)
+        )
+
+
+def stop_refresher():
+    global _refresher
+    if _refresher is not None:
+        _refresher.cancel()
+        _refresher = None
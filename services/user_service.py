@@ -1,11 +1,20 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from models import User as DBUser
 from schemas.user import UserCreate
-from services.auth_service import get_password_hash
+from typing import Optional
+from services.auth_service import (
+    get_password_hash,
+    get_password_hash_async,
+    principal_cache,
+)
+from utils.cache import cache_delete
 
 
-def create_user(db: Session, user: UserCreate):
-    hashed_password = get_password_hash(user.password)
+def create_user(db: Session, user: UserCreate, hashed_password: Optional[str] = None):
+    if hashed_password is None:
+        hashed_password = get_password_hash(user.password)
     db_user = DBUser(
         username=user.username,
         email=user.email,
@@ -16,8 +25,32 @@ def create_user(db: Session, user: UserCreate):
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    principal_cache.delete(db_user.username)
     return db_user
 
 
 def get_user(db: Session, username: str):
     return db.query(DBUser).filter(DBUser.username == username).first()
+
+
+async def create_user_async(
+    db: AsyncSession, user: UserCreate, hashed_password: Optional[str] = None
+):
+    if hashed_password is None:
+        hashed_password = await get_password_hash_async(user.password)
+    db_user = DBUser(
+        username=user.username,
+        email=user.email,
+        full_name=user.full_name,
+        hashed_password=hashed_password,
+        disabled=False,
+    )
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    await cache_delete(principal_cache, db_user.username)
+    return db_user
+
+
+async def get_user_async(db: AsyncSession, username: str):
+    return await db.scalar(select(DBUser).where(DBUser.username == username))
@@ -1,18 +1,50 @@
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import threading
+import time
 import pytest
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from main import app
+from config import settings
+from database import engine_options, to_async_url, warm_up_pool
 from dependencies.db import get_db
-from models import Base, User as DBUser, Item as DBItem, Category
-from database import DATABASE_URL
-import os
-
+from dependencies.rate_limit import login_buckets
+from models import Base, Item as DBItem, Category
+from schemas.item import Item, ItemUpdate
+from services.auth_service import principal_cache
+from services.hashing import hashing_pool
+from services.item_import import LineTooLong, iter_lines, parse_csv
+from services.item_service import (
+    add_item_service_async,
+    delete_item_service_async,
+    get_item_by_id_service_async,
+    item_reads,
+    update_item_service_async,
+)
+from utils import metrics
+from utils.cache import LRUCache, ReadThrough, RedisCache, SingleFlight
+from utils.logging import JSONFormatter
+from utils.query_stats import (
+    QueryStats,
+    instrument_engine,
+    query_stats,
+    report_repeated,
+)
+from utils.rate_limit import MemoryBuckets, RateLimit
 
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
 
 
 engine = create_engine(SQLALCHEMY_DATABASE_URL)
+instrument_engine(engine)
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
@@ -43,6 +75,12 @@ def setup_database():
     Base.metadata.drop_all(bind=engine)
 
 
+@pytest.fixture(autouse=True)
+def reset_login_throttle():
+    # Tests log in through test_login_user; give each one a full allowance.
+    login_buckets.clear()
+
+
 @pytest.fixture(scope="module")
 def db():
     db = TestingSessionLocal()
@@ -258,3 +296,1116 @@ def test_delete_item(setup_database):
     assert response.status_code == 200
     data = response.json()
     assert data["deleted"]["name"] == "Hammer"
+
+
+def test_to_async_url():
+    assert (
+        to_async_url("postgresql://myuser:password@db:5432/fastapi_database")
+        == "postgresql+asyncpg://myuser:password@db:5432/fastapi_database"
+    )
+    assert to_async_url("sqlite:///./app.db") == "sqlite+aiosqlite:///./app.db"
+    with pytest.raises(ValueError):
+        to_async_url("mysql://user@localhost/db")
+
+
+def test_async_item_services(tmp_path):
+    async def scenario():
+        async_engine = create_async_engine(to_async_url(f"sqlite:///{tmp_path}/a.db"))
+        async with async_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        AsyncTestingSession = async_sessionmaker(async_engine, expire_on_commit=False)
+        try:
+            async with AsyncTestingSession() as db:
+                added = await add_item_service_async(
+                    db, Item(name="Drill", price=5.0, category=Category.TOOLS)
+                )
+                fetched = await get_item_by_id_service_async(db, added.id)
+                assert fetched.name == "Drill"
+                updated = await update_item_service_async(
+                    db, added.id, ItemUpdate(price=7.5)
+                )
+                assert updated.price == 7.5
+                await delete_item_service_async(db, added.id)
+                with pytest.raises(HTTPException) as exc:
+                    await get_item_by_id_service_async(db, added.id)
+                assert exc.value.status_code == 404
+        finally:
+            await async_engine.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_login_rejected_when_hashing_pool_saturated(setup_database, monkeypatch):
+    test_login_user(setup_database)
+    assert hashing_pool.stats()["operations"]["verify"]["count"] >= 1
+
+    monkeypatch.setattr(hashing_pool, "max_pending", 0)
+    rejected = hashing_pool.rejected
+    response = client.post(
+        "/auth/token", data={"username": "usertest", "password": "password123"}
+    )
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert hashing_pool.stats()["rejected"] == rejected + 1
+
+
+def test_principal_cache_skips_user_lookup(setup_database):
+    token = test_login_user(setup_database)
+    headers = {"Authorization": f"Bearer {token}"}
+    principal_cache.delete("usertest")
+
+    client.put("/items/update/999", json={}, headers=headers)
+    hits = principal_cache.hits
+    response = client.put("/items/update/999", json={}, headers=headers)
+    assert response.status_code == 404
+    assert principal_cache.hits == hits + 1
+    assert principal_cache.get("usertest")["username"] == "usertest"
+
+
+def test_principal_cache_invalidated_on_user_write(setup_database):
+    principal_cache.set("cacheduser", {"id": 0, "username": "cacheduser"})
+    response = client.post(
+        "/users/register",
+        json={"username": "cacheduser", "password": "password123"},
+    )
+    assert response.status_code == 200
+    assert principal_cache.get("cacheduser") is None
+
+
+def test_stateless_tokens_skip_user_lookup(setup_database, monkeypatch):
+    from dependencies import auth as auth_dependency
+    from services.auth_service import create_access_token
+
+    token = test_login_user(setup_database)
+    monkeypatch.setattr(settings, "auth_stateless_tokens", True)
+    principal_cache.clear()
+
+    def no_lookup(*args):
+        raise AssertionError("looked up the user")
+
+    monkeypatch.setattr(auth_dependency, "get_user", no_lookup)
+    monkeypatch.setattr(auth_dependency, "get_user_async", no_lookup)
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.put("/items/update/999", json={}, headers=headers).status_code == 404
+
+    disabled = create_access_token(
+        {"sub": "usertest", "uid": 1, "disabled": True, "ver": 0}
+    )
+    response = client.put(
+        "/items/update/999", json={}, headers={"Authorization": f"Bearer {disabled}"}
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Inactive user"
+
+
+def test_logout_revokes_tokens_in_every_worker(setup_database, db):
+    from services.token_revocation import refresh_revocations, revocations
+
+    token = test_login_user(setup_database)
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.post("/auth/logout", headers=headers).status_code == 204
+    assert client.put("/items/update/999", json={}, headers=headers).status_code == 401
+
+    # Another worker learns about it from token_revocations.
+    revocations.clear()
+    assert client.put("/items/update/999", json={}, headers=headers).status_code == 404
+    refresh_revocations(db)
+    assert client.put("/items/update/999", json={}, headers=headers).status_code == 401
+
+    fresh = {"Authorization": f"Bearer {test_login_user(setup_database)}"}
+    assert client.put("/items/update/999", json={}, headers=fresh).status_code == 404
+
+
+def test_revocation_refresh_sees_late_commits(setup_database, db):
+    from datetime import datetime, timedelta, timezone
+    from models import TokenRevocation
+    from services.token_revocation import refresh_revocations, revocations
+
+    now = datetime.now(timezone.utc)
+    revocations.clear()
+    db.add(TokenRevocation(id=900, user_id=4242, token_version=1, revoked_at=now))
+    db.commit()
+    refresh_revocations(db)
+    assert revocations.is_revoked(4242, 0)
+
+    # A lower id, started earlier, that committed after the refresh above.
+    late = now - timedelta(seconds=2)
+    db.add(TokenRevocation(id=800, user_id=4343, token_version=3, revoked_at=late))
+    db.commit()
+    refresh_revocations(db)
+    assert revocations.is_revoked(4343, 2)
+    assert not revocations.is_revoked(4343, 3)
+
+
+def test_lru_cache_evicts_and_expires():
+    now = [0.0]
+    cache = LRUCache(maxsize=2, ttl=10, clock=lambda: now[0])
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)  # evicts "b", the least recently used
+    assert cache.get("b") is None
+    assert cache.stats()["evictions"] == 1
+    now[0] = 11.0
+    assert cache.get("a") is None
+    assert cache.stats()["hits"] == 1
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, px=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+def test_redis_cache_is_shared_between_workers():
+    server = FakeRedis()
+    worker_a = RedisCache(server, "principal", ttl=60)
+    worker_b = RedisCache(server, "principal", ttl=60)
+    worker_a.set("usertest", {"id": 1, "username": "usertest"})
+    assert worker_b.get("usertest") == {"id": 1, "username": "usertest"}
+    worker_b.delete("usertest")
+    assert worker_a.get("usertest") is None
+
+
+def test_read_through_refill_respects_other_workers_invalidation():
+    server = FakeRedis()
+    worker_a = ReadThrough(RedisCache(server, "item", ttl=60))
+    worker_b = ReadThrough(RedisCache(server, "item", ttl=60))
+
+    def slow_load():
+        # worker b updates the row while worker a is still reading it
+        worker_b.invalidate(1)
+        return {"price": 1.0}
+
+    assert worker_a.get(1, slow_load) == {"price": 1.0}
+    assert worker_b.peek(1) is None
+    assert worker_b.get(1, lambda: {"price": 2.0}) == {"price": 2.0}
+    assert worker_a.peek(1) is None  # still held after the write
+
+    server.data.clear()  # the tombstone expired
+    worker_b.get(1, lambda: {"price": 2.0})
+    assert worker_a.peek(1) == {"price": 2.0}
+
+
+def test_token_bucket_refills_and_stays_bounded():
+    now = [0.0]
+    buckets = MemoryBuckets(maxsize=2, clock=lambda: now[0])
+    # burst of 2, one token a second
+    assert [buckets.take("a", 2, 1.0) for _ in range(3)] == [0.0, 0.0, 1.0]
+    now[0] = 0.5
+    assert buckets.take("a", 2, 1.0) == 0.5
+    now[0] = 1.0
+    assert buckets.take("a", 2, 1.0) == 0.0
+    buckets.take("b", 2, 1.0)
+    buckets.take("c", 2, 1.0)
+    assert len(buckets) == 2
+    assert buckets.evictions == 1
+
+
+def test_login_refill_rate_must_be_positive():
+    from pydantic import ValidationError
+    from config import Settings
+
+    with pytest.raises(ValidationError):
+        Settings(login_user_per_minute=0)
+
+
+def test_login_throttled_before_password_check(setup_database, monkeypatch):
+    from dependencies import rate_limit
+    from routers import auth as auth_router
+
+    buckets = MemoryBuckets(100)
+    monkeypatch.setattr(rate_limit, "login_ip_limit", RateLimit("ip", 3, 60, buckets))
+    monkeypatch.setattr(
+        rate_limit, "login_user_limit", RateLimit("user", 1, 1, buckets)
+    )
+    checked = []
+
+    async def verify_password(plain_password, hashed_password):
+        checked.append(plain_password)
+        return False
+
+    monkeypatch.setattr(auth_router, "verify_password_async", verify_password)
+    form = {"username": "usertest", "password": "guess"}
+    assert client.post("/auth/token", data=form).status_code == 401
+    # Same username, any case: that bucket is empty and bcrypt is not reached.
+    response = client.post("/auth/token", data={**form, "username": "UserTest"})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "60"
+    assert checked == ["guess"]
+    # The client still has one attempt left for another username, then none.
+    form["username"] = "someone-else"
+    assert client.post("/auth/token", data=form).status_code == 401
+    response = client.post("/auth/token", data=form)
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_list_items_keyset_pagination(setup_database):
+    token = test_login_user(setup_database)
+    headers = {"Authorization": f"Bearer {token}"}
+    for name, price, category in [
+        ("Saw", 4.0, "tools"),
+        ("Ladder", 8.0, "tools"),
+        ("Gardening", 30.0, "service"),
+    ]:
+        client.post(
+            "/items/",
+            json={"name": name, "price": price, "category": category},
+            headers=headers,
+        )
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, "category": "tools", "max_price": 10.0}
+        if cursor is not None:
+            params["cursor"] = cursor
+        response = client.get("/items/", params=params, headers=headers)
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page["items"]) <= 2
+        seen.extend(page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    ids = [item["id"] for item in seen]
+    assert ids == sorted(ids)
+    assert {item["name"] for item in seen} >= {"Saw", "Ladder"}
+    assert all(item["category"] == "tools" and item["price"] <= 10.0 for item in seen)
+
+    response = client.get("/items/", params={"limit": 10_000}, headers=headers)
+    assert response.status_code == 422
+
+
+def test_search_items_ranked_and_paginated(setup_database):
+    token = test_login_user(setup_database)
+    headers = {"Authorization": f"Bearer {token}"}
+    for name, description in [
+        ("Cordless Drill", "Drill with two batteries"),
+        ("Drill Bits", "Set of bits for any drill"),
+        ("Sander", "Orbital sander, no drill needed"),
+    ]:
+        client.post(
+            "/items/",
+            json={
+                "name": name,
+                "description": description,
+                "price": 5.0,
+                "category": "tools",
+            },
+            headers=headers,
+        )
+
+    response = client.get("/items/search", params={"q": "drill"}, headers=headers)
+    assert response.status_code == 200
+    hits = response.json()["items"]
+    assert [hit["name"] for hit in hits][-1] == "Sander"  # description-only match
+    assert hits == sorted(hits, key=lambda hit: -hit["rank"])
+
+    response = client.get(
+        "/items/search", params={"q": "drill", "limit": 2}, headers=headers
+    )
+    page = response.json()
+    assert len(page["items"]) == 2 and page["next_offset"] == 2
+
+    # Updates are reflected without rebuilding the index
+    sander_id = hits[-1]["id"]
+    client.put(
+        f"/items/update/{sander_id}",
+        json={"description": "Orbital sander"},
+        headers=headers,
+    )
+    response = client.get(
+        "/items/search", params={"q": "orbital drill"}, headers=headers
+    )
+    assert response.json()["items"] == []
+
+
+def test_bulk_import_ndjson_reports_bad_rows(setup_database):
+    token = test_login_user(setup_database)
+    body = "\n".join(
+        [
+            '{"name": "Wrench", "price": 3.0, "category": "tools"}',
+            '{"name": "Pliers", "price": "cheap", "category": "tools"}',
+            "not json",
+            "",
+            '{"name": "Moving help", "price": 20, "category": "service"}',
+        ]
+    )
+
+    def chunks():
+        # Split mid-line to exercise incremental parsing.
+        data = body.encode()
+        while data:
+            yield data[:7]
+            data = data[7:]
+
+    response = client.post(
+        "/items/bulk",
+        content=chunks(),
+        headers={
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/x-ndjson",
+        },
+    )
+    assert response.status_code == 200
+    report = response.json()
+    assert report["inserted"] == 2
+    assert report["failed"] == 2
+    assert [error["row"] for error in report["errors"]] == [2, 3]
+    assert report["errors"][0]["error"].startswith("price:")
+
+    # Undecodable lines are bad rows, not a failed request; blank lines do
+    # not count towards row numbers, as in CSV.
+    body = (
+        b"\n"
+        b'{"name": "Plumb line", "price": 3.0, "category": "tools"}\n'
+        b'{"name": "Bad \xff byte", "price": 3.0, "category": "tools"}\n'
+        b'{"name": "Square", "price": 3.0, "category": "tools"}\n'
+    )
+    response = client.post(
+        "/items/bulk",
+        content=body,
+        headers={
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/x-ndjson",
+        },
+    )
+    assert response.status_code == 200
+    report = response.json()
+    assert report["inserted"] == 2
+    assert report["errors"] == [{"row": 2, "error": "invalid UTF-8"}]
+
+
+def test_bulk_import_csv(setup_database):
+    token = test_login_user(setup_database)
+    body = (
+        "name,description,price,category\n"
+        'Chisel,"Sharp,\nwith a guard",2.5,tools\n'
+        "Tiller,,15,tools\n"
+        "Broken,row\n"
+    )
+    response = client.post(
+        "/items/bulk",
+        content=body,
+        headers={"Authorization": f"Bearer {token}", "Content-Type": "text/csv"},
+    )
+    report = response.json()
+    assert report["inserted"] == 2
+    assert report["errors"] == [{"row": 3, "error": "expected 4 fields, got 2"}]
+
+    # A byte order mark before the header is not part of the first name.
+    response = client.post(
+        "/items/bulk",
+        content=b"\xef\xbb\xbfname,price,category\nBOM saw,4,tools\n",
+        headers={"Authorization": f"Bearer {token}", "Content-Type": "text/csv"},
+    )
+    assert response.json()["inserted"] == 1
+
+    response = client.get(
+        "/items/search",
+        params={"q": "chisel"},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.json()["items"][0]["description"] == "Sharp,\nwith a guard"
+
+    response = client.post(
+        "/items/bulk",
+        content=body,
+        headers={"Authorization": f"Bearer {token}", "Content-Type": "text/plain"},
+    )
+    assert response.status_code == 415
+
+
+def test_iter_lines_drops_overlong_lines():
+    async def chunks():
+        for chunk in [b"short\n", b"x" * 10, b"x" * 10, b"\nnext"]:
+            yield chunk
+
+    async def collect():
+        return [line async for line in iter_lines(chunks(), max_line_bytes=8)]
+
+    lines = asyncio.run(collect())
+    assert lines[0] == "short"
+    assert isinstance(lines[1], LineTooLong)
+    assert lines[2:] == ["next"]
+
+
+def test_iter_lines_checks_lines_inside_one_chunk_in_bytes():
+    async def collect(body: bytes):
+        async def chunks():
+            yield body
+
+        return [line async for line in iter_lines(chunks(), max_line_bytes=8)]
+
+    lines = asyncio.run(collect(b"ok\n" + b"y" * 140 + b"\nafter\n"))
+    assert lines[0] == "ok"
+    assert isinstance(lines[1], LineTooLong)
+    assert lines[2:] == ["after"]
+    # Five characters, ten bytes.
+    lines = asyncio.run(collect("ééééé\nfine".encode()))
+    assert isinstance(lines[0], LineTooLong)
+    assert lines[1:] == ["fine"]
+
+
+def test_parse_csv_resyncs_after_stray_quote():
+    rows = [f"Tool {i},,1,tools" for i in range(5000)]
+    body = ["name,description,price,category", 'Bad,"oops,1,tools', *rows]
+
+    async def collect(max_record_bytes):
+        async def lines():
+            for line in body:
+                yield line
+
+        return [r async for r in parse_csv(lines(), max_record_bytes)]
+
+    for max_record_bytes in (64, 65536):
+        records = asyncio.run(collect(max_record_bytes))
+        assert records[0] == (1, None, "unterminated quoted field")
+        assert len(records) == 5001
+        assert all(error is None for _, _, error in records[1:])
+        assert records[-1][1]["name"] == "Tool 4999"
+
+
+def test_export_items_streams_all_rows(setup_database, monkeypatch):
+    import database
+
+    token = test_login_user(setup_database)
+    headers = {"Authorization": f"Bearer {token}", "Accept-Encoding": "identity"}
+    with TestingSessionLocal() as session:
+        expected = session.query(DBItem).count()
+    # The export reads through the request's session, not one of its own.
+    monkeypatch.setattr(database, "SessionLocal", None)
+    monkeypatch.setattr(database, "AsyncSessionLocal", None)
+    # Several partitions, so rows are still read after the handler returned
+    monkeypatch.setattr(settings, "export_batch_size", 2)
+
+    response = client.get("/items/export", params={"format": "ndjson"}, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == expected
+    assert [row["id"] for row in rows] == sorted(row["id"] for row in rows)
+
+    response = client.get(
+        "/items/export",
+        params={"format": "csv"},
+        headers={**headers, "Accept-Encoding": "gzip"},
+    )
+    assert response.headers["content-encoding"] == "gzip"
+    # httpx transparently decompresses
+    records = list(csv.reader(io.StringIO(response.text)))
+    assert records[0] == ["id", "name", "description", "price", "category"]
+    assert len(records) == expected + 1
+
+
+def test_update_item_if_match(setup_database):
+    token = test_login_user(setup_database)
+    headers = {"Authorization": f"Bearer {token}"}
+    added = client.post(
+        "/items/",
+        json={"name": "Level", "price": 2.0, "category": "tools"},
+        headers=headers,
+    )
+    assert added.status_code == 200
+    with TestingSessionLocal() as session:
+        item = session.query(DBItem).filter(DBItem.name == "Level").one()
+        item_id, version = item.id, item.version
+    assert added.json()["added"]["id"] == item_id
+    assert added.json()["added"]["version"] == version
+
+    response = client.put(
+        f"/items/update/{item_id}",
+        json={"price": 3.0},
+        headers={**headers, "If-Match": f'"{version}"'},
+    )
+    assert response.status_code == 200
+    assert response.headers["ETag"] == f'"{version + 1}"'
+    assert response.json()["updated"]["price"] == 3.0
+
+    # A writer holding the old version loses
+    response = client.put(
+        f"/items/update/{item_id}",
+        json={"price": 4.0},
+        headers={**headers, "If-Match": f'"{version}"'},
+    )
+    assert response.status_code == 412
+
+    response = client.put(
+        "/items/update/999999",
+        json={"price": 4.0},
+        headers={**headers, "If-Match": f'"{version}"'},
+    )
+    assert response.status_code == 404
+
+    response = client.delete(
+        f"/items/delete/{item_id}", headers={**headers, "If-Match": f'"{version}"'}
+    )
+    assert response.status_code == 412
+    response = client.delete(
+        f"/items/delete/{item_id}", headers={**headers, "If-Match": f'"{version + 1}"'}
+    )
+    assert response.status_code == 200
+    assert response.json()["deleted"]["price"] == 3.0
+
+
+def test_item_cache_read_through_and_invalidation(setup_database):
+    token = test_login_user(setup_database)
+    headers = {"Authorization": f"Bearer {token}"}
+    client.post(
+        "/items/",
+        json={"name": "Trowel", "price": 1.0, "category": "tools"},
+        headers=headers,
+    )
+    with TestingSessionLocal() as session:
+        item_id = session.query(DBItem.id).filter(DBItem.name == "Trowel").scalar()
+    # SQLite reuses the id of a row deleted by an earlier test, whose
+    # tombstone would still hold off refills.
+    item_reads.cache.clear()
+
+    client.get(f"/items/items/{item_id}", headers=headers)
+    hits = item_reads.stats()["hits"]
+    response = client.get(f"/items/items/{item_id}", headers=headers)
+    assert response.json()["price"] == 1.0
+    assert item_reads.stats()["hits"] == hits + 1
+
+    client.put(f"/items/update/{item_id}", json={"price": 2.0}, headers=headers)
+    response = client.get(f"/items/items/{item_id}", headers=headers)
+    assert response.json()["price"] == 2.0
+    assert item_reads.peek(item_id) is None  # not refilled right after a write
+
+    client.delete(f"/items/delete/{item_id}", headers=headers)
+    response = client.get(f"/items/items/{item_id}", headers=headers)
+    assert response.status_code == 404
+
+
+def test_single_flight_collapses_concurrent_loads():
+    reads = ReadThrough(LRUCache(maxsize=10, ttl=60))
+    loads = []
+
+    def load():
+        loads.append(1)
+        time.sleep(0.05)
+        return {"id": 1}
+
+    threads = [threading.Thread(target=reads.get, args=(1, load)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(loads) == 1
+    assert reads.stats()["coalesced"] == 7
+
+
+def test_single_flight_async_and_stale_fill():
+    flights = SingleFlight()
+    loads = []
+
+    async def load():
+        loads.append(1)
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def scenario():
+        return await asyncio.gather(*(flights.ado("k", load) for _ in range(5)))
+
+    assert asyncio.run(scenario()) == ["value"] * 5
+    assert len(loads) == 1
+
+    # A load that races an invalidation is served but not cached
+    reads = ReadThrough(LRUCache(maxsize=10, ttl=60))
+
+    def racing_load():
+        reads.invalidate(1)
+        return {"id": 1, "stale": True}
+
+    assert reads.get(1, racing_load) == {"id": 1, "stale": True}
+    assert reads.cache.get(1) is None
+
+
+def test_get_item_conditional_etag(setup_database):
+    token = test_login_user(setup_database)
+    headers = {"Authorization": f"Bearer {token}"}
+    client.post(
+        "/items/",
+        json={"name": "Clamp", "price": 1.0, "category": "tools"},
+        headers=headers,
+    )
+    with TestingSessionLocal() as session:
+        item_id = session.query(DBItem.id).filter(DBItem.name == "Clamp").scalar()
+
+    response = client.get(f"/items/items/{item_id}", headers=headers)
+    etag = response.headers["ETag"]
+
+    response = client.get(
+        f"/items/items/{item_id}", headers={**headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+
+    # Uncached: answered from a version probe
+    item_reads.invalidate(item_id)
+    response = client.get(
+        f"/items/items/{item_id}", headers={**headers, "If-None-Match": f"W/{etag}"}
+    )
+    assert response.status_code == 304
+
+    client.put(f"/items/update/{item_id}", json={"price": 2.0}, headers=headers)
+    response = client.get(
+        f"/items/items/{item_id}", headers={**headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()["price"] == 2.0
+
+
+def test_item_routes_serialize_read_model(setup_database):
+    token = test_login_user(setup_database)
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.post(
+        "/items/",
+        json={"name": "Stapler", "price": 1.0, "category": "tools"},
+        headers=headers,
+    )
+    added = response.json()["added"]
+    assert response.headers["content-type"] == "application/json"
+    assert set(added) == {"id", "name", "description", "price", "category", "version"}
+
+    response = client.get(f"/items/items/{added['id']}", headers=headers)
+    assert response.json() == added
+
+
+def test_batch_item_fetch(setup_database, caplog, monkeypatch):
+    token = test_login_user(setup_database)
+    headers = {"Authorization": f"Bearer {token}"}
+    ids = [
+        client.post(
+            "/items/",
+            json={"name": f"Batch {i}", "price": 1.0, "category": "tools"},
+            headers=headers,
+        ).json()["added"]["id"]
+        for i in range(3)
+    ]
+    wanted = [ids[2], 999999, ids[0], ids[2]]
+
+    with caplog.at_level("INFO"):
+        response = client.get(
+            "/items/batch", params={"ids": ",".join(map(str, wanted))}, headers=headers
+        )
+    assert response.status_code == 200
+    body = response.json()
+    assert [item["id"] for item in body["items"]] == [ids[2], ids[0]]
+    assert body["items"][0]["name"] == "Batch 2"
+    assert body["missing"] == [999999]
+    line = [r for r in caplog.records if r.name == "toolshare.request"][-1]
+    assert line.route == "/items/batch"
+    assert line.db_queries == 1
+
+    response = client.post("/items/batch", json={"ids": wanted}, headers=headers)
+    assert response.json() == body
+
+    monkeypatch.setattr(settings, "items_batch_max", 2)
+    response = client.post("/items/batch", json={"ids": ids}, headers=headers)
+    assert response.status_code == 422
+    assert response.json()["detail"] == "At most 2 ids per batch"
+    assert client.get("/items/batch?ids=1,x", headers=headers).status_code == 422
+    # Ids past the INTEGER column and oversized bodies fail validation.
+    huge = 2**63
+    assert client.get(f"/items/batch?ids={huge}", headers=headers).status_code == 422
+    response = client.post("/items/batch", json={"ids": [huge]}, headers=headers)
+    assert response.status_code == 422
+    response = client.post(
+        "/items/batch", json={"ids": list(range(1, 1000))}, headers=headers
+    )
+    assert response.status_code == 422
+    # Repeats count once on POST, as on GET
+    monkeypatch.setattr(settings, "items_batch_max", 100)
+    repeated = [ids[0]] * 150
+    response = client.post("/items/batch", json={"ids": repeated}, headers=headers)
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()["items"]] == [ids[0]]
+    query = ",".join(map(str, repeated))
+    response = client.get(f"/items/batch?ids={query}", headers=headers)
+    assert response.status_code == 200
+
+
+def test_request_log_line_is_structured(setup_database, caplog, monkeypatch):
+    token = test_login_user(setup_database)
+    headers = {"Authorization": f"Bearer {token}"}
+    with caplog.at_level("INFO", logger="toolshare.request"):
+        client.get("/items/items/999999", headers=headers)
+    record = [r for r in caplog.records if r.name == "toolshare.request"][-1]
+    line = json.loads(JSONFormatter().format(record))
+    assert line["method"] == "GET"
+    assert line["route"] == "/items/items/{item_id}"
+    assert line["status"] == 404
+    assert line["duration_ms"] >= 0
+
+    # Successes are sampled, errors are not
+    monkeypatch.setattr(settings, "log_success_sample_rate", 0.0)
+    caplog.clear()
+    with caplog.at_level("INFO", logger="toolshare.request"):
+        client.get("/items/", headers=headers)
+        client.get("/items/items/999999", headers=headers)
+    statuses = [r.status for r in caplog.records if r.name == "toolshare.request"]
+    assert statuses == [404]
+
+
+def test_shutdown_logging_detaches_the_queue():
+    from utils import logging as app_logging
+
+    handler = app_logging._queue_handler
+    app_logging.shutdown_logging()
+    assert handler not in logging.getLogger().handlers
+    app_logging.setup_logging()
+    assert app_logging._queue_handler in logging.getLogger().handlers
+
+
+def test_request_id_header_and_log_context(setup_database, caplog):
+    token = test_login_user(setup_database)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = client.get("/items/", headers=headers)
+    generated = response.headers["X-Request-ID"]
+    assert len(generated) == 32
+    assert response.headers["Server-Timing"].startswith("app;dur=")
+
+    with caplog.at_level("INFO", logger="toolshare.request"):
+        response = client.get(
+            "/items/", headers={**headers, "X-Request-ID": "trace-123"}
+        )
+    assert response.headers["X-Request-ID"] == "trace-123"
+    record = [r for r in caplog.records if r.name == "toolshare.request"][-1]
+    assert record.request_id == "trace-123"
+
+    # Unsafe client values are replaced rather than echoed
+    response = client.get("/items/", headers={**headers, "X-Request-ID": "a b"})
+    assert response.headers["X-Request-ID"] != "a b"
+
+
+def test_export_streams_through_middleware(setup_database):
+    token = test_login_user(setup_database)
+    headers = {"Authorization": f"Bearer {token}"}
+    for i in range(3):
+        client.post(
+            "/items/",
+            json={"name": f"Saw {i}", "price": 1.0, "category": "tools"},
+            headers=headers,
+        )
+    with client.stream("GET", "/items/export", headers=headers) as response:
+        assert response.status_code == 200
+        assert "content-length" not in response.headers
+        assert "X-Request-ID" in response.headers
+        lines = [line for line in response.iter_lines() if line]
+    assert len(lines) >= 3
+
+
+def test_metrics_endpoint(setup_database):
+    token = test_login_user(setup_database)
+    client.get("/items/items/424242", headers={"Authorization": f"Bearer {token}"})
+    client.get("/no/such/path")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    assert "# TYPE toolshare_http_request_duration_seconds histogram" in body
+    assert (
+        'toolshare_http_requests_total{method="GET",'
+        'route="/items/items/{item_id}",status="404"}'
+    ) in body
+    assert 'route="<unmatched>"' in body
+    assert 'toolshare_http_request_duration_seconds_bucket{method="POST",' in body
+    assert 'toolshare_password_hash_duration_seconds_count{operation="verify"}' in body
+    assert "toolshare_http_requests_in_flight 1.0" in body  # the scrape itself
+    assert 'toolshare_cache_lookups_total{cache="principal",result="hit"}' in body
+    assert 'toolshare_cache_lookups_total{cache="item",result="miss"}' in body
+    assert 'toolshare_cache_entries{cache="item"}' in body
+
+
+def test_metrics_merge_across_workers(tmp_path):
+    local = metrics.Registry()
+    requests = local.counter("requests_total", "Requests.", ("route",))
+    in_flight = local.gauge("in_flight", "In flight.")
+    latency = local.histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+    requests.inc(route="/a")
+    in_flight.inc()
+    latency.observe(0.05)
+    latency.observe(5.0)
+
+    # A worker that has exited: its counters still count, its gauges do not.
+    dead = local.snapshot()
+    dead["pid"] = 2**22 + 1
+    metrics.write_snapshot(str(tmp_path), dead)
+
+    merged = metrics.merge([local.snapshot(), *metrics.read_snapshots(str(tmp_path))])
+    text = metrics.render(merged)
+    assert 'requests_total{route="/a"} 2.0' in text
+    assert "in_flight 1.0" in text
+    assert 'latency_seconds_bucket{le="0.1"} 2' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 4' in text
+    assert "latency_seconds_count 4" in text
+    assert "latency_seconds_sum 10.1" in text
+
+
+def test_request_log_carries_query_stats(setup_database, caplog, monkeypatch):
+    token = test_login_user(setup_database)
+    monkeypatch.setattr(settings, "slow_query_ms", 0.0)
+    with caplog.at_level("INFO"):
+        response = client.get(
+            "/items/?category=tools", headers={"Authorization": f"Bearer {token}"}
+        )
+    assert "db;dur=" in response.headers["Server-Timing"]
+    line = [r for r in caplog.records if r.name == "toolshare.request"][-1]
+    assert line.db_queries >= 1
+    assert line.db_ms >= 0
+
+    # With a zero threshold every statement is "slow"; values never reach the log
+    slow = [r for r in caplog.records if r.name == "utils.query_stats"]
+    assert slow
+    assert not any("TOOLS" in str(r.parameters) for r in slow)
+    assert any("<redacted>" in str(r.parameters) for r in slow)
+
+
+def test_repeated_statements_are_flagged(setup_database, db, caplog, monkeypatch):
+    monkeypatch.setattr(settings, "n_plus_one_threshold", 3)
+    stats = QueryStats()
+    token = query_stats.set(stats)
+    try:
+        for item_id in range(1, 5):
+            db.query(DBItem).filter(DBItem.id == item_id).first()
+    finally:
+        query_stats.reset(token)
+    assert stats.count == 4
+    with caplog.at_level("WARNING", logger="utils.query_stats"):
+        report_repeated(stats, "GET", "/items/")
+    assert "ran the same statement 4 times" in caplog.text
+
+
+def test_engine_options(monkeypatch):
+    postgres = "postgresql+asyncpg://user:pw@db/toolshare"
+    options = engine_options(postgres)
+    assert options["pool_pre_ping"] is True
+    assert options["pool_size"] == settings.db_pool_size
+    assert options["pool_recycle"] == settings.db_pool_recycle
+    assert "connect_args" not in options
+
+    monkeypatch.setattr(settings, "db_pgbouncer", True)
+    connect_args = engine_options(postgres)["connect_args"]
+    assert connect_args["statement_cache_size"] == 0
+    assert connect_args["prepared_statement_cache_size"] == 0
+    names = {connect_args["prepared_statement_name_func"]() for _ in range(2)}
+    assert len(names) == 2
+    # psycopg2 never prepares statements server-side
+    assert "connect_args" not in engine_options("postgresql://user:pw@db/toolshare")
+    # SQLite keeps its own pool class, which takes no sizing arguments
+    assert set(engine_options("sqlite:///x.db")) == {"pool_pre_ping"}
+
+
+def test_pool_warm_up():
+    import database
+
+    assert warm_up_pool(2) == 2
+    assert database.engine.pool.checkedin() >= 2
+
+
+def test_reads_go_to_replica_until_client_writes(setup_database, tmp_path, monkeypatch):
+    import database
+    from dependencies.db import recent_writers
+
+    token = test_login_user(setup_database)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    # A second SQLite database stands in for the replica.
+    replica_engine = create_engine(f"sqlite:///{tmp_path}/replica.db")
+    Base.metadata.create_all(bind=replica_engine)
+    Replica = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+    with Replica() as replica:
+        replica.add(DBItem(name="Replica only", price=1.0, category=Category.TOOLS))
+        replica.commit()
+    monkeypatch.setattr(database, "ReplicaSessionLocals", [Replica])
+    recent_writers.clear()
+
+    def names():
+        response = client.get("/items/?limit=200", headers=headers)
+        assert response.status_code == 200
+        return {item["name"] for item in response.json()["items"]}
+
+    assert "Replica only" in names()
+    # Replica reads are served but never cached: they may predate a write.
+    item_reads.invalidate(1)
+    response = client.get("/items/items/1", headers=headers)
+    assert response.json()["name"] == "Replica only"
+    assert item_reads.peek(1) is None
+
+    # Writing pins this client to the primary for the stickiness window...
+    added = client.post(
+        "/items/",
+        json={"name": "Primary only", "price": 2.0, "category": "tools"},
+        headers=headers,
+    )
+    assert added.status_code == 200
+    after_write = names()
+    assert "Primary only" in after_write
+    assert "Replica only" not in after_write
+    item_id = added.json()["added"]["id"]
+    response = client.get(f"/items/items/{item_id}", headers=headers)
+    assert response.json()["name"] == "Primary only"
+    assert item_reads.peek(item_id) is not None
+
+    # ...after which reads return to the replica.
+    recent_writers.clear()
+    assert "Replica only" in names()
+
+    # Behind a proxy every client shares the proxy's address; stickiness
+    # keys on the forwarded one.
+    from starlette.requests import Request
+    from dependencies.db import _client_keys
+
+    monkeypatch.setattr(settings, "client_ip_header", "Fly-Client-IP")
+    request = Request(
+        {
+            "type": "http",
+            "headers": [(b"fly-client-ip", b"203.0.113.7")],
+            "client": ("10.0.0.1", 4321),
+        }
+    )
+    assert _client_keys(request) == ["ip:203.0.113.7"]
+    replica_engine.dispose()
+
+
+def test_server_options(monkeypatch):
+    import database
+    import server
+
+    assert server.available_cpus() >= 1
+    monkeypatch.setattr(settings, "web_concurrency", 0)
+    monkeypatch.setattr(settings, "cache_url", None)
+    assert server.options()["workers"] == 1
+    monkeypatch.setattr(settings, "cache_url", "redis://cache:6379/0")
+    assert server.options()["workers"] == server.available_cpus()
+    monkeypatch.setattr(settings, "web_concurrency", 3)
+    assert server.options()["workers"] == 3
+
+    # The workers' bcrypt pools share the CPUs between them.
+    monkeypatch.setattr(server, "available_cpus", lambda: 8)
+    monkeypatch.setattr(settings, "metrics_dir", "/tmp/toolshare-test-metrics")
+    monkeypatch.setattr(settings, "hashing_workers", 0)
+    monkeypatch.setenv("HASHING_WORKERS", "0")
+    monkeypatch.setattr(server.Server, "run", lambda self: None)
+    server.main()
+    assert settings.hashing_workers == 2
+    assert os.environ["HASHING_WORKERS"] == "2"
+
+    # A forked worker starts with an empty pool of its own.
+    warm_up_pool(1)
+    pool = database.engine.pool
+    database.dispose_after_fork()
+    assert database.engine.pool is not pool
+    assert database.engine.pool.checkedin() == 0
+
+
+def test_init_db_only_migrates_when_behind(monkeypatch):
+    import database
+    from models import SCHEMA_REVISION
+
+    calls = []
+    monkeypatch.setattr(database, "run_migrations", lambda: calls.append("upgrade"))
+    monkeypatch.setattr(database, "schema_revision", lambda connection: SCHEMA_REVISION)
+    database.init_db()
+    assert calls == []
+
+    monkeypatch.setattr(database, "schema_revision", lambda connection: "0001")
+    database.init_db()
+    assert calls == ["upgrade"]
+
+    monkeypatch.setattr(settings, "migrate_on_startup", False)
+    database.init_db()
+    assert calls == ["upgrade"]
+
+
+def test_migrations_match_models(tmp_path):
+    from alembic.autogenerate import compare_metadata
+    from alembic.config import Config
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+    from database import run_migrations, schema_revision
+    from migrations.helpers import include_for_dialect
+    from models import SCHEMA_REVISION
+
+    head = ScriptDirectory.from_config(Config("alembic.ini")).get_current_head()
+    assert head == SCHEMA_REVISION
+
+    url = f"sqlite:///{tmp_path}/migrated.db"
+    run_migrations(url=url)
+    migrated = create_engine(url)
+    with migrated.connect() as connection:
+        assert schema_revision(connection) == SCHEMA_REVISION
+        context = MigrationContext.configure(
+            connection, opts={"include_object": include_for_dialect("sqlite")}
+        )
+        assert compare_metadata(context, Base.metadata) == []
+    migrated.dispose()
+
+
+def test_migrations_upgrade_pre_migration_database(tmp_path):
+    from sqlalchemy import inspect, text
+    from database import run_migrations
+
+    # A database as create_all built it before items gained version/search
+    url = f"sqlite:///{tmp_path}/legacy.db"
+    run_migrations("0001", url=url)
+    legacy = create_engine(url)
+    with legacy.begin() as connection:
+        connection.execute(
+            text(
+                "INSERT INTO items (name, price, category) VALUES ('Old drill', 3, 'TOOLS')"
+            )
+        )
+
+    run_migrations(url=url)
+    with legacy.connect() as connection:
+        version = connection.scalar(text("SELECT version FROM items"))
+        indexes = {index["name"] for index in inspect(connection).get_indexes("items")}
+    assert version == 1
+    assert "ix_items_description" not in indexes
+    assert {"ix_items_category_id", "ix_items_price_id"} <= indexes
+    legacy.dispose()
+
+
+def test_precomputed_openapi(tmp_path, monkeypatch):
+    from fastapi import FastAPI
+    from utils.openapi import SETTINGS_KEY, schema_settings, use_precomputed
+
+    demo = FastAPI()
+
+    @demo.get("/ping")
+    def ping():
+        return {}
+
+    path = tmp_path / "openapi.json"
+    use_precomputed(demo, str(path))
+    assert "/ping" in demo.openapi()["paths"]  # no file: generated
+
+    demo.openapi_schema = None
+    built = {"openapi": "3.1.0", "paths": {"/from-file": {}}}
+    path.write_text(json.dumps({**built, SETTINGS_KEY: schema_settings()}))
+    assert demo.openapi() == built
+
+    # Built with other limits than this process has: generated
+    demo.openapi_schema = None
+    monkeypatch.setattr(settings, "items_batch_max", settings.items_batch_max + 1)
+    assert "/ping" in demo.openapi()["paths"]
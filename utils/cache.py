@@ -0,0 +1,321 @@
+"""Small caches shared by the service layer.
+
+``LRUCache`` is a bounded, per-process LRU with a TTL on every entry.
+``RedisCache`` keeps entries in a Redis-compatible server so that every
+worker sees the same values and the same invalidations. Both store plain
+JSON-compatible values and keep hit/miss counters for this process.
+``ReadThrough`` puts either one in front of a loader, collapsing concurrent
+misses for the same key into a single load. ``export_stats`` publishes a
+cache's ``stats()`` on ``/metrics``.
+"""
+
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional
+from utils.metrics import registry
+from utils.stores import InProcessStore, RedisStore, dispatch, redis_client
+
+CACHE_LOOKUPS = registry.counter(
+    "toolshare_cache_lookups_total",
+    "Cache lookups in this process, by cache and hit or miss.",
+    ("cache", "result"),
+)
+CACHE_EVICTIONS = registry.counter(
+    "toolshare_cache_evictions_total",
+    "Entries an in-process cache dropped to stay within its size.",
+    ("cache",),
+)
+CACHE_COALESCED = registry.counter(
+    "toolshare_cache_coalesced_total",
+    "Misses that waited for a concurrent load of the same key.",
+    ("cache",),
+)
+CACHE_ENTRIES = registry.gauge(
+    "toolshare_cache_entries",
+    "Entries held by an in-process cache.",
+    ("cache",),
+)
+
+
+# Left in place of an invalidated entry: reads miss, add() does not replace it.
+_TOMBSTONE = object()
+_REDIS_TOMBSTONE = b"\x00"
+
+
+class LRUCache(InProcessStore):
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._clock = clock
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= self._clock():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            if entry[1] is _TOMBSTONE:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def _put(self, key, value, ttl: float):
+        self._data[key] = (self._clock() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def set(self, key, value: Any):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._put(key, value, self.ttl)
+
+    def add(self, key, value: Any) -> bool:
+        """``set`` unless ``key`` holds a live entry or tombstone."""
+        if self.maxsize <= 0:
+            return False
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > self._clock():
+                return False
+            self._put(key, value, self.ttl)
+            return True
+
+    def tombstone(self, key, ttl: float):
+        """Replace ``key`` with a marker that blocks ``add`` for ``ttl`` seconds."""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._put(key, _TOMBSTONE, ttl)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class RedisCache(RedisStore):
+    def __init__(self, client, namespace: str, ttl: float):
+        super().__init__(client, namespace)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        raw = self.client.get(self._key(key))
+        if raw is None or raw == _REDIS_TOMBSTONE:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return json.loads(raw)
+
+    def set(self, key, value: Any):
+        self.client.set(self._key(key), json.dumps(value), px=int(self.ttl * 1000))
+
+    def add(self, key, value: Any) -> bool:
+        return bool(
+            self.client.set(
+                self._key(key), json.dumps(value), px=int(self.ttl * 1000), nx=True
+            )
+        )
+
+    def tombstone(self, key, ttl: float):
+        self.client.set(self._key(key), _REDIS_TOMBSTONE, px=int(ttl * 1000))
+
+    def delete(self, key):
+        self.client.delete(self._key(key))
+
+    def stats(self) -> dict:
+        return {"backend": "redis", "hits": self.hits, "misses": self.misses}
+
+
+def build_cache(namespace: str, maxsize: int, ttl: float, url: Optional[str] = None):
+    """Return the shared cache when ``url`` is configured, else a local LRU."""
+    if url:
+        return RedisCache(redis_client(url), namespace, ttl)
+    return LRUCache(maxsize, ttl)
+
+
+async def cache_get(cache, key, default=None):
+    return await dispatch(cache, "get", key, default)
+
+
+async def cache_set(cache, key, value: Any):
+    await dispatch(cache, "set", key, value)
+
+
+async def cache_delete(cache, key):
+    await dispatch(cache, "delete", key)
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into one execution."""
+
+    def __init__(self):
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._calls: dict = {}
+        self._futures: dict = {}
+
+    def do(self, key, fn: Callable[[], Any]):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {"done": threading.Event()}
+            else:
+                self.coalesced += 1
+        if not leader:
+            call["done"].wait()
+            if "error" in call:
+                raise call["error"]
+            return call["result"]
+        try:
+            call["result"] = fn()
+            return call["result"]
+        except BaseException as exc:
+            call["error"] = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call["done"].set()
+
+    async def ado(self, key, fn: Callable[[], Awaitable[Any]]):
+        future = self._futures.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+        future = self._futures[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result
+        except BaseException as exc:
+            future.set_exception(exc)
+            future.exception()  # followers re-raise it; don't warn if none
+            raise
+        finally:
+            del self._futures[key]
+
+
+class ReadThrough:
+    """Read-through cache with single-flight loads.
+
+    ``load`` returns the value to cache, or None for "no such key" (misses
+    are not cached). A load that overlaps an ``invalidate`` is returned to
+    its callers but not stored, so it cannot reinstate pre-write data.
+    In this process that is tracked exactly. For other processes sharing
+    the cache, ``invalidate`` leaves a tombstone for ``hold`` seconds, and
+    loads are only stored with ``add``, which does not replace it. So
+    ``hold`` should be longer than any load takes. With ``store=False``
+    (a load from a possibly stale source) a miss is loaded for the caller
+    alone and never stored.
+    """
+
+    def __init__(self, cache, hold: float = 5.0):
+        self.cache = cache
+        self.hold = hold
+        self._flights = SingleFlight()
+        self._invalidations = 0
+
+    def get(self, key, load: Callable[[], Any], store: bool = True):
+        value = self.cache.get(key)
+        if value is not None:
+            return value
+        if not store:
+            return load()
+        return self._flights.do(key, lambda: self._fill(key, load))
+
+    async def aget(self, key, load: Callable[[], Awaitable[Any]], store: bool = True):
+        value = await cache_get(self.cache, key)
+        if value is not None:
+            return value
+        if not store:
+            return await load()
+        return await self._flights.ado(key, lambda: self._afill(key, load))
+
+    def peek(self, key):
+        """Cached value or None; never loads."""
+        return self.cache.get(key)
+
+    async def apeek(self, key):
+        return await cache_get(self.cache, key)
+
+    def invalidate(self, key):
+        self._invalidations += 1
+        self.cache.tombstone(key, self.hold)
+
+    async def ainvalidate(self, key):
+        self._invalidations += 1
+        await dispatch(self.cache, "tombstone", key, self.hold)
+
+    def _fill(self, key, load):
+        invalidations = self._invalidations
+        value = load()
+        if value is not None and invalidations == self._invalidations:
+            self.cache.add(key, value)
+        return value
+
+    async def _afill(self, key, load):
+        invalidations = self._invalidations
+        value = await load()
+        if value is not None and invalidations == self._invalidations:
+            await dispatch(self.cache, "add", key, value)
+        return value
+
+    def stats(self) -> dict:
+        return {**self.cache.stats(), "coalesced": self._flights.coalesced}
+
+
+def export_stats(name: str, cache):
+    """Report ``cache.stats()`` on ``/metrics`` with the label ``cache=name``."""
+
+    def collect():
+        stats = cache.stats()
+        CACHE_LOOKUPS.set_total(stats["hits"], cache=name, result="hit")
+        CACHE_LOOKUPS.set_total(stats["misses"], cache=name, result="miss")
+        # Redis caches have no local size or evictions.
+        if "evictions" in stats:
+            CACHE_EVICTIONS.set_total(stats["evictions"], cache=name)
+        if "size" in stats:
+            CACHE_ENTRIES.set(stats["size"], cache=name)
+        if "coalesced" in stats:
+            CACHE_COALESCED.set_total(stats["coalesced"], cache=name)
+
+    registry.add_collector(collect)
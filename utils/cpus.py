@@ -0,0 +1,20 @@
+"""How much CPU this process may use, for sizing worker and process pools."""
+
+import math
+import os
+
+
+def available_cpus() -> int:
+    """CPUs this process may run on, capped by a cgroup v2 CPU quota."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
@@ -1,20 +1,172 @@
+"""Application logging.
+
+Every record goes through a ``QueueHandler``; a ``QueueListener`` thread
+owns the rotating file and console handlers, so request handlers never wait
+on disk or stdout. Requests are logged as one structured line each by
+``log_request``, with successful requests sampled at
+``settings.log_success_sample_rate``. Records emitted while a request is
+being served carry its ``request_id``.
+"""
+
+import atexit
+import contextvars
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+import os
+import queue
+import random
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Optional
+from config import settings
+
+request_logger = logging.getLogger("toolshare.request")
+
+# Set by the request middleware for the duration of each request.
+request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "request_id", default=None
+)
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[QueueHandler] = None
+
+# LogRecord attributes; anything else on a record came from ``extra``.
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the current request ID, if any.
+
+    Attached to the queue handler, so it runs in the thread that logged the
+    record, where the context variable is still set.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        current = request_id.get()
+        if current is not None:
+            record.request_id = current
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    # Tracebacks arrive already rendered into the message: QueueHandler
+    # formats exc_info when it enqueues a record.
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(
+            (key, value)
+            for key, value in record.__dict__.items()
+            if key not in _RESERVED
+        )
+        return json.dumps(entry, default=str)
 
 
-def setup_logging(log_file: str = "app.log"):
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s - %(levelname)s - %(message)s",
-        handlers=[
-            RotatingFileHandler(log_file, maxBytes=1000000, backupCount=3),
-            logging.StreamHandler(),
-        ],
+def setup_logging(
+    log_file: str = settings.log_file,
+    level: str = settings.log_level,
+    fmt: str = settings.log_format,
+) -> QueueListener:
+    """Route the root logger through a queue drained by a background thread.
+
+    Safe to call more than once; later calls are no-ops.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return _listener
+
+    if fmt == "json":
+        formatter = JSONFormatter()
+    else:
+        formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+
+    os.makedirs(os.path.dirname(log_file) or ".", exist_ok=True)
+    # File handler: rotates at 1MB; stream handler: stdout for Docker logs
+    file_handler = RotatingFileHandler(log_file, maxBytes=1000000, backupCount=3)
+    console_handler = logging.StreamHandler()
+    for handler in (file_handler, console_handler):
+        handler.setFormatter(formatter)
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(level)
+    _queue_handler = QueueHandler(log_queue)
+    _queue_handler.addFilter(RequestIdFilter())
+    root.addHandler(_queue_handler)
+
+    _listener = QueueListener(
+        log_queue, file_handler, console_handler, respect_handler_level=True
     )
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return _listener
+
 
-    logger = logging.getLogger(__name__)
-    return logger
+def restart_after_fork(log_to_file: bool = True):
+    """Start this process's own listener; threads do not survive fork().
 
+    A new queue is used so records the parent had not written yet are not
+    written again by every child. With ``log_to_file=False`` the child logs
+    to stdout only: processes sharing one rotating file each rotate it on
+    their own and overwrite one another's records.
+    """
+    global _listener
+    if _listener is None:
+        return
+    handlers = _listener.handlers
+    if not log_to_file:
+        handlers = [
+            handler
+            for handler in handlers
+            if not isinstance(handler, RotatingFileHandler)
+        ]
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    _queue_handler.queue = log_queue
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
 
-# Initialize logging
-logger = setup_logging()
+
+def shutdown_logging():
+    """Flush queued records, stop the listener thread and detach the queue.
+
+    Without a listener nothing would drain the queue, so the root logger
+    goes back to having no handler of ours.
+    """
+    global _listener, _queue_handler
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def log_request(
+    method: str, route: str, status: int, duration_ms: float, **fields
+) -> None:
+    """Emit the one structured line for a finished request.
+
+    Errors (status >= 400) are always logged; successes are sampled.
+    """
+    if status < 400 and random.random() >= settings.log_success_sample_rate:
+        return
+    request_logger.info(
+        "%s %s %s %.1fms",
+        method,
+        route,
+        status,
+        duration_ms,
+        extra={
+            "method": method,
+            "route": route,
+            "status": status,
+            "duration_ms": round(duration_ms, 2),
+            **fields,
+        },
+    )
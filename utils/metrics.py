@@ -0,0 +1,299 @@
+"""In-process metrics in the Prometheus text exposition format.
+
+Metrics are plain dicts of label values to numbers. They are only updated
+from the event loop thread (the request middleware, the hashing pool), so
+recording a sample is a dict lookup and an add with no lock.
+
+With several uvicorn workers each process has its own registry. When
+``settings.metrics_dir`` is set, every worker periodically writes a snapshot
+to ``<metrics_dir>/<pid>.json`` and ``/metrics`` merges the snapshots of all
+workers with its own live one: counters and histograms are summed, gauges
+are summed over workers that are still running. The directory should be
+emptied when the server starts.
+"""
+
+import asyncio
+import bisect
+import glob
+import json
+import logging
+import math
+import os
+from typing import Callable, Optional
+from starlette.concurrency import run_in_threadpool
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labels)
+        self._values = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> list:
+        return [[list(key), value] for key, value in list(self._values.items())]
+
+    def describe(self) -> dict:
+        return {
+            "type": self.type,
+            "help": self.documentation,
+            "labels": list(self.labelnames),
+            "samples": self.samples(),
+        }
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set_total(self, value: float, **labels):
+        """Mirror a running total kept elsewhere, e.g. by a collector."""
+        self._values[self._key(labels)] = float(value)
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Per-bucket (non-cumulative) counts, with the sum as the last entry."""
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            # One slot per bucket, one for +Inf, one for the sum.
+            state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        state[bisect.bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def samples(self) -> list:
+        return [[list(key), list(state)] for key, state in list(self._values.items())]
+
+    def describe(self) -> dict:
+        return {**super().describe(), "buckets": list(self.buckets)}
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._collectors: list[Callable[[], None]] = []
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric '{metric.name}' is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labels=()) -> Counter:
+        return self._register(Counter(name, documentation, labels))
+
+    def gauge(self, name, documentation, labels=()) -> Gauge:
+        return self._register(Gauge(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def add_collector(self, collect: Callable[[], None]):
+        """Run ``collect`` before every snapshot, e.g. to set gauges."""
+        self._collectors.append(collect)
+
+    def snapshot(self) -> dict:
+        for collect in self._collectors:
+            try:
+                collect()
+            except Exception:
+                logger.exception("Metrics collector %r failed", collect)
+        return {
+            "pid": os.getpid(),
+            "metrics": {
+                name: metric.describe() for name, metric in self._metrics.items()
+            },
+        }
+
+
+registry = Registry()
+
+HTTP_REQUESTS = registry.counter(
+    "toolshare_http_requests_total",
+    "Requests handled, by method, route template and status.",
+    ("method", "route", "status"),
+)
+HTTP_REQUEST_DURATION = registry.histogram(
+    "toolshare_http_request_duration_seconds",
+    "Time from receiving a request to sending the last body byte.",
+    ("method", "route", "status"),
+)
+HTTP_IN_FLIGHT = registry.gauge(
+    "toolshare_http_requests_in_flight",
+    "Requests currently being handled.",
+)
+
+
+def merge(snapshots: list[dict]) -> dict:
+    """Sum samples with the same name and labels across worker snapshots."""
+    merged: dict[str, dict] = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot["metrics"].items():
+            target = merged.setdefault(name, {**metric, "samples": {}})
+            for labels, value in metric["samples"]:
+                key = tuple(labels)
+                current = target["samples"].get(key)
+                if current is None:
+                    target["samples"][key] = value
+                elif isinstance(value, list):
+                    target["samples"][key] = [a + b for a, b in zip(current, value)]
+                else:
+                    target["samples"][key] = current + value
+    return merged
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(merged: dict) -> str:
+    lines = []
+    for name, metric in sorted(merged.items()):
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        names = metric["labels"]
+        for values, value in sorted(metric["samples"].items()):
+            if metric["type"] != "histogram":
+                lines.append(f"{name}{_labels(names, values)} {_number(value)}")
+                continue
+            *counts, total = value
+            cumulative = 0
+            for bound, count in zip([*metric["buckets"], math.inf], counts):
+                cumulative += count
+                le = f'le="{_number(float(bound))}"'
+                lines.append(f"{name}_bucket{_labels(names, values, le)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(names, values)} {_number(total)}")
+            lines.append(f"{name}_count{_labels(names, values)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def write_snapshot(directory: str, snapshot: dict):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{snapshot['pid']}.json")
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(snapshot, f)
+    os.replace(tmp, path)
+
+
+def read_snapshots(directory: str, exclude_pid: Optional[int] = None) -> list[dict]:
+    """Load other workers' snapshots; gauges of exited workers are dropped."""
+    snapshots = []
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if snapshot["pid"] == exclude_pid:
+            continue
+        if not _pid_alive(snapshot["pid"]):
+            snapshot["metrics"] = {
+                name: metric
+                for name, metric in snapshot["metrics"].items()
+                if metric["type"] != "gauge"
+            }
+        snapshots.append(snapshot)
+    return snapshots
+
+
+async def exposition() -> str:
+    """The ``/metrics`` body: this worker's live metrics plus the others'."""
+    local = registry.snapshot()
+    snapshots = [local]
+    if settings.metrics_dir:
+        snapshots += await run_in_threadpool(
+            read_snapshots, settings.metrics_dir, local["pid"]
+        )
+    return render(merge(snapshots))
+
+
+_flusher: Optional[asyncio.Task] = None
+
+
+async def _flush_periodically(directory: str, interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(write_snapshot, directory, registry.snapshot())
+        except OSError:
+            logger.exception("Could not write metrics snapshot to %s", directory)
+
+
+def start_flusher():
+    """Start writing this worker's snapshots, if multi-worker metrics are on."""
+    global _flusher
+    if settings.metrics_dir and _flusher is None:
+        _flusher = asyncio.create_task(
+            _flush_periodically(settings.metrics_dir, settings.metrics_flush_interval)
+        )
+
+
+async def stop_flusher():
+    """Stop the flusher and write a final snapshot so counters survive exit."""
+    global _flusher
+    if _flusher is not None:
+        _flusher.cancel()
+        _flusher = None
+        await run_in_threadpool(
+            write_snapshot, settings.metrics_dir, registry.snapshot()
+        )
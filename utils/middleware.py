@@ -0,0 +1,111 @@
+"""Request middleware, written against raw ASGI.
+
+``@app.middleware("http")`` runs every request through ``BaseHTTPMiddleware``,
+which spawns a task per request and re-wraps the response body in a memory
+stream. Here the app's ``send`` is wrapped instead: headers are amended as
+the response starts and the body messages go through as they are, so
+streaming responses stay streaming.
+"""
+
+import re
+import time
+import uuid
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from utils import logging as app_logging
+from utils import metrics
+from utils.query_stats import QueryStats, query_stats, report_repeated
+from utils.routes import route_template
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+# Client-supplied IDs are echoed into headers and logs, so keep them tame.
+_VALID_REQUEST_ID = re.compile(r"[A-Za-z0-9._:-]{1,128}")
+
+
+def _incoming_request_id(scope: Scope):
+    for name, value in scope["headers"]:
+        if name == b"x-request-id":
+            value = value.decode("latin-1")
+            return value if _VALID_REQUEST_ID.fullmatch(value) else None
+    return None
+
+
+class RequestContextMiddleware:
+    """Assign a request ID, time the request, log and count it once it finishes.
+
+    The ID is taken from ``X-Request-ID`` when the client sends a sane one and
+    generated otherwise; it is returned in the same header, exposed as
+    ``request.state.request_id`` and attached to every log record emitted
+    while the request is handled. ``Server-Timing`` reports the time to the
+    first response byte and the database time up to then; the log line has
+    the full duration and the request's query count and database time.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        request_id = _incoming_request_id(scope) or uuid.uuid4().hex
+        scope.setdefault("state", {})["request_id"] = request_id
+        token = app_logging.request_id.set(request_id)
+        stats = QueryStats()
+        stats_token = query_stats.set(stats)
+        status = 500
+        logged = False
+        metrics.HTTP_IN_FLIGHT.inc()
+
+        def finish():
+            nonlocal logged
+            if logged:
+                return
+            logged = True
+            duration = time.perf_counter() - start
+            route = route_template(scope)
+            metrics.HTTP_IN_FLIGHT.dec()
+            # Unmatched paths share one label so clients cannot mint series.
+            labels = {
+                "method": scope["method"],
+                "route": route or "<unmatched>",
+                "status": status,
+            }
+            metrics.HTTP_REQUESTS.inc(**labels)
+            metrics.HTTP_REQUEST_DURATION.observe(duration, **labels)
+            app_logging.log_request(
+                scope["method"],
+                route or scope["path"],
+                status,
+                duration * 1000,
+                **stats.summary(),
+            )
+            report_repeated(stats, scope["method"], route or scope["path"])
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers[REQUEST_ID_HEADER] = request_id
+                headers.append(
+                    "Server-Timing",
+                    f"app;dur={(time.perf_counter() - start) * 1000:.1f}, "
+                    f"db;dur={stats.seconds * 1000:.1f}",
+                )
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get(
+                "more_body", False
+            ):
+                finish()
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Covers errors and clients that disconnect mid-stream.
+            finish()
+            query_stats.reset(stats_token)
+            app_logging.request_id.reset(token)
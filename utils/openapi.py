@@ -0,0 +1,72 @@
+"""OpenAPI schema generated at build time instead of in the serving process.
+
+FastAPI builds the schema on the first ``/openapi.json`` request, which on a
+freshly started machine means the first visitor of ``/docs`` waits for it.
+``python -m utils.openapi openapi.json`` writes the schema once (the
+Dockerfile does this at build time) and ``use_precomputed`` makes the app
+serve that file, falling back to generating it when the file is missing.
+
+Some limits in the schema come from settings (``ITEMS_PAGE_SIZE_MAX``,
+``ITEMS_BATCH_MAX``, ...). The file records the values it was built with
+and is not used when the running process has different ones.
+
+Usage:
+    python -m utils.openapi openapi.json
+"""
+
+import json
+import logging
+import os
+import sys
+from typing import Optional
+from fastapi import FastAPI
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Settings that end up in the schema, as route parameter limits.
+SCHEMA_SETTINGS = ("items_page_size", "items_page_size_max", "items_batch_max")
+SETTINGS_KEY = "x-toolshare-settings"
+
+
+def schema_settings() -> dict:
+    return {name: getattr(settings, name) for name in SCHEMA_SETTINGS}
+
+
+def _load(path: str) -> Optional[dict]:
+    if not os.path.exists(path):
+        logger.info("No precomputed OpenAPI schema at %s", path)
+        return None
+    with open(path) as f:
+        schema = json.load(f)
+    if schema.pop(SETTINGS_KEY, None) != schema_settings():
+        logger.info("Precomputed OpenAPI schema at %s has other limits", path)
+        return None
+    return schema
+
+
+def use_precomputed(app: FastAPI, path: str):
+    generate = app.openapi
+
+    def openapi() -> dict:
+        if app.openapi_schema is None:
+            app.openapi_schema = _load(path) or generate()
+        return app.openapi_schema
+
+    app.openapi = openapi
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    path = argv[0] if argv else "openapi.json"
+    from main import app
+
+    # Generate from the routes, ignoring any stale file at the target path.
+    app.openapi_schema = None
+    schema = {**FastAPI.openapi(app), SETTINGS_KEY: schema_settings()}
+    with open(path, "w") as f:
+        json.dump(schema, f, separators=(",", ":"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Per-request SQL accounting.
+
+Cursor execution events on each engine add to the ``QueryStats`` of the
+current request (a context variable set by the request middleware, which
+threadpool calls and the async driver's greenlets both inherit). Statements
+slower than ``settings.slow_query_ms`` are logged with their parameters
+redacted, and a statement text repeated ``settings.n_plus_one_threshold``
+times within one request is reported as a likely N+1 query.
+"""
+
+import contextvars
+import logging
+import time
+from collections import Counter
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+REDACTED = "<redacted>"
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements: Counter = Counter()
+
+    def record(self, statement: str, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        self.statements[statement] += 1
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        """Statements executed at least ``threshold`` times, most frequent first."""
+        return [
+            (statement, count)
+            for statement, count in self.statements.most_common()
+            if count >= threshold
+        ]
+
+    def summary(self) -> dict:
+        """Fields for the request log line."""
+        return {"db_queries": self.count, "db_ms": round(self.seconds * 1000, 2)}
+
+
+query_stats: contextvars.ContextVar[Optional[QueryStats]] = contextvars.ContextVar(
+    "query_stats", default=None
+)
+
+
+def redact(parameters, executemany: bool = False):
+    """Keep the shape of bound parameters (names, arity, rows) but not values."""
+    if executemany:
+        return f"<{len(parameters)} parameter sets>"
+    if isinstance(parameters, dict):
+        return {key: REDACTED for key in parameters}
+    if isinstance(parameters, (list, tuple)):
+        return [REDACTED] * len(parameters)
+    return REDACTED
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info["query_start"].pop()
+    stats = query_stats.get()
+    if stats is not None:
+        stats.record(statement, seconds)
+    if seconds * 1000 >= settings.slow_query_ms:
+        logger.warning(
+            "Slow query (%.1fms): %s",
+            seconds * 1000,
+            statement,
+            extra={
+                "duration_ms": round(seconds * 1000, 2),
+                "statement": statement,
+                "parameters": redact(parameters, executemany),
+            },
+        )
+
+
+def instrument_engine(engine: Engine):
+    """Attach the cursor hooks; pass ``async_engine.sync_engine`` for async."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def report_repeated(stats: QueryStats, method: str, route: str):
+    """Warn about statements repeated often enough to look like N+1 access."""
+    for statement, count in stats.repeated(settings.n_plus_one_threshold):
+        logger.warning(
+            "Possible N+1: %s %s ran the same statement %d times: %s",
+            method,
+            route,
+            count,
+            statement,
+            extra={"statement": statement, "executions": count},
+        )
@@ -0,0 +1,109 @@
+"""Token-bucket rate limits.
+
+A bucket holds up to ``burst`` tokens and refills at ``per_minute`` tokens a
+minute. Every attempt takes a token; an attempt that finds the bucket empty
+takes nothing and is told how many seconds until the next token.
+``MemoryBuckets`` keeps one bucket per key in a bounded per-process LRU (an
+evicted key comes back with a full bucket). ``RedisBuckets`` keeps them in a
+Redis-compatible server and updates them with a Lua script, so every worker
+draws from the same bucket.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+from utils.stores import InProcessStore, RedisStore, dispatch, redis_client
+
+
+def _take(tokens: float, elapsed: float, burst: int, rate: float):
+    """Refill for ``elapsed`` seconds and take a token: (tokens, wait)."""
+    tokens = min(burst, tokens + max(elapsed, 0.0) * rate)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / rate
+
+
+class MemoryBuckets(InProcessStore):
+    def __init__(self, maxsize: int, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.evictions = 0
+        self._clock = clock
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, burst: int, rate: float) -> float:
+        with self._lock:
+            now = self._clock()
+            tokens, updated = self._data.get(key, (burst, now))
+            tokens, wait = _take(tokens, now - updated, burst, rate)
+            self._data[key] = (tokens, now)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+            return wait
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+# Same arithmetic as _take, on the server's clock. Keys expire once they
+# would have refilled, since a missing key reads as a full bucket. Lua
+# numbers come back as integers, hence the string.
+_TAKE_SCRIPT = """
+local burst = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(now - updated, 0) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+return tostring(wait)
+"""
+
+
+class RedisBuckets(RedisStore):
+    def __init__(self, client, namespace: str):
+        super().__init__(client, namespace)
+        self._script = client.register_script(_TAKE_SCRIPT)
+
+    def take(self, key: str, burst: int, rate: float) -> float:
+        return float(self._script(keys=[self._key(key)], args=[burst, rate]))
+
+
+def build_buckets(namespace: str, maxsize: int, url: Optional[str] = None):
+    """Return shared buckets when ``url`` is configured, else a local LRU."""
+    if url:
+        return RedisBuckets(redis_client(url), namespace)
+    return MemoryBuckets(maxsize)
+
+
+class RateLimit:
+    """``burst`` attempts at once, then ``per_minute``; burst 0 disables it."""
+
+    def __init__(self, name: str, burst: int, per_minute: float, buckets):
+        self.name = name
+        self.burst = burst
+        self.rate = per_minute / 60
+        self.buckets = buckets
+
+    async def hit(self, key: str) -> float:
+        """Take a token for ``key``; seconds to wait if there was none, else 0."""
+        if self.burst <= 0:
+            return 0.0
+        key = f"{self.name}:{key}"
+        return await dispatch(self.buckets, "take", key, self.burst, self.rate)
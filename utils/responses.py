@@ -0,0 +1,30 @@
+"""JSON rendering for the item routes.
+
+Routes that return a ``Response`` skip FastAPI's response-model validation
+and encoding, so ``serialize`` does that work exactly once: it validates the
+value (ORM rows included, via ``from_attributes``) with a cached
+``TypeAdapter`` and lets pydantic-core write JSON bytes directly.
+"""
+
+from functools import lru_cache
+from pydantic import TypeAdapter
+from starlette.responses import JSONResponse
+
+
+class JSONBytesResponse(JSONResponse):
+    """Passes bytes from ``serialize`` through instead of encoding them again."""
+
+    def render(self, content) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return super().render(content)
+
+
+@lru_cache(maxsize=None)
+def type_adapter(tp) -> TypeAdapter:
+    return TypeAdapter(tp)
+
+
+def serialize(tp, value) -> bytes:
+    adapter = type_adapter(tp)
+    return adapter.dump_json(adapter.validate_python(value, from_attributes=True))
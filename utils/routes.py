@@ -0,0 +1,32 @@
+"""Route templates for logs and metrics.
+
+Routers included with a prefix are matched lazily, so the route a request
+ends up on (``scope["route"]``) only knows its own path, not the prefix.
+The full templates are resolved once per app from its route contexts.
+"""
+
+from typing import Optional
+from fastapi.routing import iter_route_contexts
+from starlette.types import Scope
+
+_templates: dict[int, dict[int, str]] = {}
+
+
+def _resolve(app) -> dict[int, str]:
+    templates = _templates.get(id(app))
+    if templates is None:
+        templates = {
+            id(context.original_route): context.path
+            for context in iter_route_contexts(app.routes)
+            if context.path is not None
+        }
+        _templates[id(app)] = templates
+    return templates
+
+
+def route_template(scope: Scope) -> Optional[str]:
+    """Return e.g. ``/items/items/{item_id}``, or None if no route matched."""
+    route = scope.get("route")
+    if route is None:
+        return None
+    return _resolve(scope["app"]).get(id(route), getattr(route, "path", None))
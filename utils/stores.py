@@ -0,0 +1,48 @@
+"""What the caches and rate-limit buckets have in common.
+
+Each store is either in-process (``blocking = False``) or kept in a
+Redis-compatible server under ``toolshare:<namespace>:`` keys
+(``blocking = True``). ``dispatch`` calls a store from the event loop
+either way.
+"""
+
+from starlette.concurrency import run_in_threadpool
+
+
+class InProcessStore:
+    # Pure in-memory: safe to call straight from the event loop.
+    blocking = False
+
+
+class RedisStore:
+    # Every call is a network round trip.
+    blocking = True
+
+    def __init__(self, client, namespace: str):
+        self.client = client
+        self.namespace = namespace
+
+    def _key(self, key) -> str:
+        return f"toolshare:{self.namespace}:{key}"
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self._key("*")):
+            self.client.delete(key)
+
+
+def redis_client(url: str):
+    try:
+        import redis
+    except ImportError as exc:
+        raise RuntimeError(
+            "CACHE_URL is set but the 'redis' package is not installed"
+        ) from exc
+    return redis.Redis.from_url(url)
+
+
+async def dispatch(store, method: str, *args):
+    """Call ``store.<method>(*args)``, in the threadpool if the store blocks."""
+    fn = getattr(store, method)
+    if store.blocking:
+        return await run_in_threadpool(fn, *args)
+    return fn(*args)